@@ -0,0 +1,50 @@
+"""
+Chart rendering via charts module vs Config.plotly_summary*: python benchmarks/bench_charts.py
+"""
+import time
+
+from ea_giving_optimizer import charts
+from ea_giving_optimizer.helpers import create_dummy_conf, run_linear_optimization, run_long_horizon_optimization
+
+
+def timed(func, repeats=10):
+    start = time.perf_counter()
+    for _ in range(repeats):
+        func()
+    return (time.perf_counter() - start) / repeats * 1000
+
+
+def main(height=300, width=750):
+    lifetime = create_dummy_conf(
+        current_age=30,
+        life_exp_years=85,
+        month_salary_k_per_age={30: 4, 64: 6, 65: 1.5},
+        month_req_cost_k_per_age={30: 2, 65: 1.2},
+        implementation_factor_per_age={30: 1, 85: 0.5},
+        existential_risk_discount_rate=0.02,
+    )
+    run_linear_optimization(lifetime)
+
+    # Foundation like horizon of 720 yearly periods
+    long_horizon = create_dummy_conf(horizon_years=720, existential_risk_discount_rate=0.002)
+    run_long_horizon_optimization(long_horizon)
+
+    for name, conf in [('lifetime (56 points)', lifetime), ('long horizon (720 yearly points)', long_horizon)]:
+        def current():
+            conf.plotly_summary_cum(height=height, width=width).to_json()
+            conf.plotly_summary(height=height, width=width).to_json()
+
+        def lightweight():
+            for kind in ['cum', 'yearly']:
+                charts.render_figure(charts.chart_spec(conf, kind), height=height, width=width).to_json()
+
+        def lightweight_cold():
+            charts.figure_cache.clear()
+            lightweight()
+
+        print(f'{name}: plotly_summary* {timed(current):.1f} ms, '
+              f'charts uncached {timed(lightweight_cold):.1f} ms, charts cached {timed(lightweight):.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""
+Numba kernels vs NumPy fallback for 100k simulated return paths: python benchmarks/bench_kernels.py
+"""
+import time
+
+import numpy as np
+
+from ea_giving_optimizer import kernels
+
+
+def best_of(func, *args, repeats=5):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main(n_paths=100_000, n_years=60):
+    rng = np.random.default_rng(0)
+    disp = rng.uniform(10, 50, size=n_years)
+    mult = 1 + rng.normal(0.04, 0.15, size=(n_paths, n_years)) - 0.02
+    give = np.zeros((n_paths, n_years))
+    salary = rng.uniform(20, 200, size=n_paths)
+    cost = rng.uniform(10, 50, size=n_paths)
+    tax = rng.uniform(0, 0.6, size=n_paths)
+
+    print(f'{n_paths} paths x {n_years} years')
+    cases = [
+        ('wealth_paths', (disp, mult, give)),
+        ('disposable_for_giving', (salary, cost, tax, False)),
+        ('compound_matrix', (n_years, 1.02)),
+    ]
+    for name, args in cases:
+        numpy_time = best_of(getattr(kernels, f'{name}_numpy'), *args)
+        numba_impl = getattr(kernels, f'{name}_numba')
+        if numba_impl is None:
+            print(f'{name:>22}: numpy {numpy_time * 1000:.2f} ms, numba not installed')
+            continue
+        numba_impl(*args)  # Compile
+        numba_time = best_of(numba_impl, *args)
+        print(f'{name:>22}: numpy {numpy_time * 1000:.2f} ms, numba {numba_time * 1000:.2f} ms '
+              f'({numpy_time / numba_time:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
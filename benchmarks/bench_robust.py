@@ -0,0 +1,35 @@
+"""
+Scenario-tree optimization at scale: python benchmarks/bench_robust.py
+With the default (10, 10, 10) tree this solves in about 0.6 s (expected) and 2-2.5 s (worst case, CVaR) here.
+A fan of independent paths, branching=(1000,), has a node per (scenario, year) and takes about 12 s for worst
+case and CVaR.
+"""
+import time
+
+from ea_giving_optimizer.helpers import create_dummy_conf
+from ea_giving_optimizer.robust import run_robust_optimization, simulate_return_scenarios
+
+
+def main(branching=(10, 10, 10), n_years=60):
+    conf = create_dummy_conf(
+        current_age=20,
+        life_exp_years=20 + n_years - 1,
+        month_salary_k_per_age={20: 4, 64: 6, 65: 1.5},
+        month_req_cost_k_per_age={20: 2, 65: 1.2},
+        implementation_factor_per_age={20: 1, 79: 0.8},
+        existential_risk_discount_rate=0.02,
+        save_qa_life_cost_k=3.5,
+    )
+    returns = simulate_return_scenarios(len(conf.df), mean=0.04, std=0.15, branching=branching, seed=0)
+    n_scenarios = len(returns)
+
+    for objective in ['expected', 'worst_case', 'cvar']:
+        start = time.perf_counter()
+        run_robust_optimization(conf, returns, objective=objective)
+        elapsed = time.perf_counter() - start
+        print(f'{objective:>10}: {n_scenarios} scenarios x {len(conf.df)} years solved in {elapsed:.2f} s, '
+              f'lives saved = {conf.lives_saved}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""
+Warm started GivingSolver vs cold linprog on a 1000 point x-risk sweep: python benchmarks/bench_warm_start.py
+"""
+import time
+
+import numpy as np
+from scipy.optimize import linprog
+
+from ea_giving_optimizer.helpers import GivingSolver, create_dummy_conf, get_b_ub, get_optimization_variables
+
+
+def main(n_points=1000):
+    conf = create_dummy_conf(
+        current_age=30,
+        life_exp_years=85,
+        month_salary_k_per_age={30: 4, 64: 6, 65: 1.5},
+        month_req_cost_k_per_age={30: 2, 65: 1.2},
+        implementation_factor_per_age={30: 1, 55: 0.9, 85: 0.5},
+        return_rate_after_inflation=0.03,
+    )
+    x_risk_rates = np.linspace(0, 0.06, n_points)
+
+    start = time.perf_counter()
+    cold_objectives = []
+    for x_risk in x_risk_rates:
+        conf.net_return_mult = 1 + conf.return_rate_after_inflation - x_risk
+        c_impl, A_ub, b_ub = get_optimization_variables(conf)
+        cold_objectives.append(linprog(c_impl, A_ub, b_ub).fun)
+    cold = time.perf_counter() - start
+
+    # A_ub for the new r is assembled inside the solver
+    disp = conf.df.disposable_for_giving.to_dict()
+    c_impl = -1 * conf.df.implementation_factor.values
+    solver = GivingSolver(length=len(conf.df))
+    start = time.perf_counter()
+    warm_objectives = []
+    for x_risk in x_risk_rates:
+        conf.net_return_mult = 1 + conf.return_rate_after_inflation - x_risk
+        b_ub = get_b_ub(disp=disp, r=conf.net_return_mult)
+        warm_objectives.append(c_impl @ solver.solve(c_impl, b_ub, r=conf.net_return_mult))
+    warm = time.perf_counter() - start
+
+    assert np.allclose(cold_objectives, warm_objectives, rtol=1e-6)
+    print(f'{n_points} point x-risk sweep over {len(conf.df)} years')
+    print(f'cold linprog:  {cold:.2f} s')
+    print(f'GivingSolver:  {warm:.2f} s ({cold / warm:.1f}x), '
+          f'{solver.n_warm} warm starts, {solver.n_cold} linprog solves')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,20 +1,41 @@
+import os
+import sys
+
 import streamlit as st
 
-# Relative import rather than module import for Streamlit to work
-from helpers import (
+# Streamlit only puts this folder on the path, add the repo root so that modules are imported from the package
+# under the same names as everywhere else (e.g. for the on disk cache of the compiled kernels)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ea_giving_optimizer.helpers import (
     Config,
-    run_linear_optimization,
+    basic_mode_per_age,
     dict_values_to_thousands,
     dict_keys_to_thousands,
     check_valid_keys,
 )
+from ea_giving_optimizer.prefetch import Prefetcher
+from ea_giving_optimizer.memory_profile import default_profiler, profile_run
+from ea_giving_optimizer.charts import chart_spec, render_figure
+
+
+BASIC_MODE_INPUTS = [
+    'current_salary_k',
+    'salary_increase_rate',
+    'age_of_retirement',
+    'salary_after_retirement_k',
+    'cost_of_living_k',
+]
 
 
-def constant_dict(current_age, life_exp_years, value) -> dict:
-    result_dict = {}
-    result_dict[current_age] = value
-    result_dict[life_exp_years] = value
-    return result_dict
+def solve_config(**params) -> Config:
+    # Basic mode passes the slider values rather than per age dicts, so that the prefetcher can nudge them
+    if 'current_salary_k' in params:
+        basic_inputs = {k: params.pop(k) for k in BASIC_MODE_INPUTS}
+        params.update(basic_mode_per_age(params['current_age'], params['life_exp_years'], **basic_inputs))
+
+    # Config and solve as separate profiler stages, also when run by the prefetch thread
+    return profile_run(params, default_profiler, plot=False)
 
 
 # # # INTRO BEFORE FORM
@@ -51,6 +72,11 @@ def switch_mode():
     st.session_state.is_advanced = not(st.session_state.is_advanced)
 
 
+# Result cache per session, with neighbouring slider values solved in the background after each run
+if 'prefetcher' not in st.session_state:
+    st.session_state.prefetcher = Prefetcher(solve_config, cpu_budget_s=1.0, session_cpu_budget_s=30.0)
+
+
 other_mode = 'Advanced' if not(st.session_state.is_advanced) else 'Basic'
 st.button(f'Switch to {other_mode} mode', on_click=switch_mode)
 
@@ -117,23 +143,11 @@ with st.form("input_assumptions", clear_on_submit=False):
                 'Current monthly salary in USD before tax',
                 min_value=0, max_value=100000000000, value=3500
             )/1000
-            month_salary_k_per_age = constant_dict(current_age, life_exp_years, value=current_salary_k)
             salary_increase_rate = st.slider('Salary increase [%] after inflation per year until retirement', min_value=0.0,
                                              max_value=50.0, value=2.0, step=0.5) / 100
             salary_after_retirement_k = st.number_input('Monthly income after retirement before tax in USD', min_value=0,
                                                      max_value=100000000000, value=1500) / 1000
 
-            # TODO write unit test for this function
-            for years, age in enumerate(
-                range(min(month_salary_k_per_age.keys()) + 1, max(month_salary_k_per_age.keys()) + 1),
-                start=1
-            ):
-                if age < age_of_retirement:
-                    # Recursively apply interest on previous salary
-                    month_salary_k_per_age[age] = round(month_salary_k_per_age[age-1] * (1 + salary_increase_rate), 2)
-                else:
-                    month_salary_k_per_age[age] = salary_after_retirement_k
-
         if st.session_state.is_advanced:
             month_req_cost_k_per_age = st.text_input(
                 'Required cost of living per month per age as a dictionary '
@@ -146,7 +160,16 @@ with st.form("input_assumptions", clear_on_submit=False):
                 'Required cost of living per month in USD',
                 min_value=0, max_value=100000000000, value=1000
             )/1000
-            month_req_cost_k_per_age = constant_dict(current_age, life_exp_years, value=cost_of_living_k)
+            basic_inputs = dict(
+                current_salary_k=current_salary_k,
+                salary_increase_rate=salary_increase_rate,
+                age_of_retirement=age_of_retirement,
+                salary_after_retirement_k=salary_after_retirement_k,
+                cost_of_living_k=cost_of_living_k,
+            )
+            basic_per_age = basic_mode_per_age(current_age, life_exp_years, **basic_inputs)
+            month_salary_k_per_age = basic_per_age['month_salary_k_per_age']
+            month_req_cost_k_per_age = basic_per_age['month_req_cost_k_per_age']
 
         default_tax = {0: 0.18, 2000: 0.2, 3000: 0.2, 4000: 0.225, 5000: 0.26, 6000: 0.3, 10000: 0.38}
         if st.session_state.is_advanced:
@@ -171,7 +194,7 @@ with st.form("input_assumptions", clear_on_submit=False):
             )
             implementation_factor_per_age = eval(implementation_factor_per_age)
         else:
-            implementation_factor_per_age = constant_dict(current_age, life_exp_years, 1)
+            implementation_factor_per_age = basic_per_age['implementation_factor_per_age']
 
         has_reality_check = st.checkbox('Display underlying dataset')
 
@@ -219,7 +242,7 @@ if run:
                      f"set higher current age.")
 
         else:
-            conf = Config(
+            params = dict(
                 save_qa_life_cost_k=save_qa_life_cost_k,
                 is_giving_pretax=is_giving_pretax,
                 current_age=current_age,
@@ -227,13 +250,17 @@ if run:
                 current_savings_k=current_savings_k,
                 return_rate_after_inflation=return_rate_after_inflation,
                 existential_risk_discount_rate=existential_risk_discount_rate,
-                month_salary_k_per_age=month_salary_k_per_age,
-                month_req_cost_k_per_age=month_req_cost_k_per_age,
                 share_tax_per_k_salary=share_tax_per_k_salary,
-                implementation_factor_per_age=implementation_factor_per_age
             )
-
-            run_linear_optimization(conf)
+            if st.session_state.is_advanced:
+                params.update(
+                    month_salary_k_per_age=month_salary_k_per_age,
+                    month_req_cost_k_per_age=month_req_cost_k_per_age,
+                    implementation_factor_per_age=implementation_factor_per_age,
+                )
+            else:
+                params.update(basic_inputs)
+            conf = st.session_state.prefetcher.solve(params)
 
             if (conf.df['disposable_for_giving'] < 0).any():
                 st.write(
@@ -250,11 +277,21 @@ if run:
 
             # Plotly graphs
             height, width = 300, 750
-            st.plotly_chart(conf.plotly_summary_cum(height=height, width=width))
-            st.plotly_chart(conf.plotly_summary(height=height, width=width))
+            with default_profiler.stage('plot'):
+                for kind in ['cum', 'yearly']:
+                    st.plotly_chart(render_figure(chart_spec(conf, kind), height=height, width=width))
 
             if has_reality_check:
                 st.dataframe(conf.df.reset_index())
 
+            if st.session_state.is_advanced:
+                prefetch_stats = st.session_state.prefetcher.stats()
+                st.caption(f"Result cache hit rate: {prefetch_stats['hit_rate']:.0%}, "
+                           f"prefetched results used: {prefetch_stats['prefetch_hit_rate']:.0%}")
+
+            # Opt-in with environment variable EA_MEMORY_PROFILE=1
+            if default_profiler.enabled and st.session_state.is_advanced:
+                st.dataframe(default_profiler.report(by_thread=True))
+
     except Exception as e:
         st.write(f'{error_pretext}{e}')
@@ -0,0 +1,101 @@
+"""
+Lightweight rendering of result charts. A chart spec is only the x/y arrays of a result plus the name of the chart,
+all charts share LAYOUT_TEMPLATE, and rendered figures are cached by a hash of the spec so that re-rendering the
+same result (e.g. a cached solve) is free. Long horizons are downsampled to at most max_points points.
+Same charts as Config.plotly_summary_cum and Config.plotly_summary, without DataFrame copies or plotly.express.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from plotly import graph_objects as go
+
+
+DEFAULT_MAX_POINTS = 400
+MAX_CACHED_FIGURES = 32
+
+LAYOUT_TEMPLATE = dict(
+    xaxis=dict(title=dict(text='Age')),
+    margin=dict(t=40, b=40, l=60, r=20),
+    showlegend=False,
+)
+
+CHARTS = {
+    'cum': dict(
+        column='give_recommendation_m',
+        is_cumulative=True,
+        y_title='Cum. Suggested Giving [m USD]',
+        title='Cumulative suggested giving over your lifetime [million USD]',
+    ),
+    'yearly': dict(
+        column='give_recommendation_k',
+        is_cumulative=False,
+        y_title='Suggested Giving [k USD]',
+        title='Suggested giving each year of your life [thousand USD] (i.e. not cumulative)',
+    ),
+}
+
+# Shared by all app sessions, which run in separate threads
+figure_cache = OrderedDict()
+figure_cache_lock = threading.Lock()
+
+
+def downsample(x: np.ndarray, y: np.ndarray, max_points: int):
+    """
+    Keep the min and max of y in each of max_points // 2 buckets, plus first and last point, so that peaks
+    (e.g. a single large gift) survive downsampling.
+    """
+    if len(x) <= max_points:
+        return x, y
+    n_buckets = max(max_points // 2 - 1, 1)
+    idx = [0, len(x) - 1]
+    for bucket in np.array_split(np.arange(1, len(x) - 1), n_buckets):
+        idx.extend([bucket[np.argmin(y[bucket])], bucket[np.argmax(y[bucket])]])
+    idx = np.unique(idx)
+    return x[idx], y[idx]
+
+
+def chart_spec(conf, kind: str, max_points: int = DEFAULT_MAX_POINTS) -> dict:
+    chart = CHARTS[kind]
+    y = conf.df[chart['column']].values
+    if chart['is_cumulative']:
+        y = np.cumsum(y)
+    x, y = downsample(conf.df.index.values, np.round(y, 3), max_points)
+    return {'kind': kind, 'x': x, 'y': y}
+
+
+def spec_hash(spec: dict, height: int, width: int) -> str:
+    content = hashlib.sha1(f"{spec['kind']}:{height}:{width}:{len(spec['x'])}".encode())
+    content.update(np.ascontiguousarray(spec['x']).tobytes())
+    content.update(np.ascontiguousarray(spec['y']).tobytes())
+    return content.hexdigest()
+
+
+def render_figure(spec: dict, height: int = 350, width: int = 800) -> go.Figure:
+    # Cached figures are shared, so they should not be modified by the caller
+    key = spec_hash(spec, height, width)
+    with figure_cache_lock:
+        if key in figure_cache:
+            figure_cache.move_to_end(key)
+            return figure_cache[key]
+
+    chart = CHARTS[spec['kind']]
+    fig = go.Figure(
+        data=[go.Scatter(x=spec['x'], y=spec['y'], mode='lines')],
+        layout=dict(
+            LAYOUT_TEMPLATE,
+            yaxis=dict(title=dict(text=chart['y_title'])),
+            title=dict(text=chart['title']),
+            height=height,
+            width=width,
+        ),
+    )
+
+    with figure_cache_lock:
+        # Another thread may have rendered the same spec meanwhile, keep the first so callers share one figure
+        fig = figure_cache.setdefault(key, fig)
+        figure_cache.move_to_end(key)
+        while len(figure_cache) > MAX_CACHED_FIGURES:
+            figure_cache.popitem(last=False)
+    return fig
@@ -1,8 +1,12 @@
 import numpy as np
 import pandas as pd
 from plotly import express as px
+from scipy import sparse
+from scipy.linalg import lu_factor, lu_solve
 from scipy.optimize import linprog
 
+from ea_giving_optimizer import kernels
+
 
 class Config:
 
@@ -12,7 +16,6 @@ class Config:
              # General assumptions
              current_age: int,
              current_savings_k: float,
-             life_exp_years: int,
              save_qa_life_cost_k: float,
              is_giving_pretax: bool,
 
@@ -31,29 +34,32 @@ class Config:
 
              # E.g. leaking money to other causes
              implementation_factor_per_age: dict,
-    ):
 
-        # Assert Consistency
-        assert all((0 <= v <= 1) for v in share_tax_per_k_salary.values())
-        assert max(share_tax_per_k_salary.keys()) >= max(month_salary_k_per_age.values()), \
-            'Maximum share tax doesnt cover span of salaries'
-        assert min(share_tax_per_k_salary.keys()) <= min(month_salary_k_per_age.values()), \
-            'Minimum share tax doesnt cover span of salaries'
-        assert all((0 <= v <= 1) for v in implementation_factor_per_age.values())
-        assert life_exp_years > current_age
-        assert -0.1 <= return_rate_after_inflation <= 0.3
-        assert 0 <= existential_risk_discount_rate <= 0.99
+             # Last age of the plan, required unless horizon_years is given
+             life_exp_years: int = None,
 
-        self.life_exp_years = life_exp_years
-        self.save_qa_life_cost_k = save_qa_life_cost_k
-        self.net_return_mult = 1 + return_rate_after_inflation - existential_risk_discount_rate
-        self.is_giving_pretax = is_giving_pretax
-        assert 0.01 <= self.net_return_mult <= 2  # Return multiplier can be < 1 after existential risk
+             # Long horizon e.g. foundations, number of periods from current age regardless of life expectancy
+             horizon_years: int = None,
 
-        # Save for metadata e.g. prints on ffill
-        self.implementation_factor_per_age = implementation_factor_per_age
-        self.month_salary_k_per_age = month_salary_k_per_age
-        self.month_req_cost_k_per_age = month_req_cost_k_per_age
+             # Value per k left at the end of the horizon, in the same units as implementation factor
+             terminal_value_factor: float = 0.0,
+    ):
+
+        self.set_params(
+            current_age=current_age,
+            current_savings_k=current_savings_k,
+            save_qa_life_cost_k=save_qa_life_cost_k,
+            is_giving_pretax=is_giving_pretax,
+            month_salary_k_per_age=month_salary_k_per_age,
+            month_req_cost_k_per_age=month_req_cost_k_per_age,
+            share_tax_per_k_salary=share_tax_per_k_salary,
+            return_rate_after_inflation=return_rate_after_inflation,
+            existential_risk_discount_rate=existential_risk_discount_rate,
+            implementation_factor_per_age=implementation_factor_per_age,
+            life_exp_years=life_exp_years,
+            horizon_years=horizon_years,
+            terminal_value_factor=terminal_value_factor,
+        )
 
         salary_per_age_df = self.interpolate_df_from_dict(
             month_salary_k_per_age,
@@ -96,11 +102,12 @@ class Config:
         # to capture start and stop values that might be outside bounds
         df = self.ffill_bfill_cols(df)
 
-        # Reindex if current_age or death is outside bounds for other values
+        # Reindex if current_age or death (or end of horizon) is outside bounds for other values
+        last_age = life_exp_years if horizon_years is None else current_age + horizon_years - 1
         df = (
             df
             .set_index('age')
-            .reindex(list(range(current_age, life_exp_years + 1)))
+            .reindex(list(range(current_age, last_age + 1)))
             .reset_index()
         )
 
@@ -129,7 +136,8 @@ class Config:
         df = df.loc[df['age'] >= current_age]
 
         df['years'] = np.arange(len(df))
-        df['compound_interest'] = self.net_return_mult ** df['years']  # After infl and exist risk
+        # After infl and exist risk, in log space to not overflow for long horizons
+        df['compound_interest'] = np.exp(df['years'] * np.log(self.net_return_mult))
         df['salary_k_year'] = df['salary_k'] * 12
 
         df = self.calc_disposable_for_giving(df, is_giving_pretax)
@@ -142,19 +150,93 @@ class Config:
         df = df.set_index('age')
         assert df.isna().sum().sum() == 0, 'There are nulls in df'
         self.df = df
+        self.init_result_placeholders()
+
+    @classmethod
+    def from_df(cls, df: pd.DataFrame, tax_per_salary_df: pd.DataFrame, **params):
+        """
+        Config from an already interpolated df, e.g. a compiled scenario, skipping the interpolation in __init__.
+        params are the same keyword arguments as for __init__.
+        """
+        conf = cls.__new__(cls)
+        conf.set_params(**params)
+        conf.tax_per_salary_df = tax_per_salary_df
+        assert df.isna().sum().sum() == 0, 'There are nulls in df'
+        conf.df = df
+        conf.init_result_placeholders()
+        return conf
 
+    def set_params(
+            self,
+            current_age: int,
+            current_savings_k: float,
+            save_qa_life_cost_k: float,
+            is_giving_pretax: bool,
+            month_salary_k_per_age: dict,
+            month_req_cost_k_per_age: dict,
+            share_tax_per_k_salary: dict,
+            return_rate_after_inflation: float,
+            existential_risk_discount_rate: float,
+            implementation_factor_per_age: dict,
+            life_exp_years: int = None,
+            horizon_years: int = None,
+            terminal_value_factor: float = 0.0,
+    ):
+        # Checks and attributes shared by __init__ and from_df, same arguments as __init__
+
+        # Assert Consistency
+        assert all((0 <= v <= 1) for v in share_tax_per_k_salary.values())
+        assert max(share_tax_per_k_salary.keys()) >= max(month_salary_k_per_age.values()), \
+            'Maximum share tax doesnt cover span of salaries'
+        assert min(share_tax_per_k_salary.keys()) <= min(month_salary_k_per_age.values()), \
+            'Minimum share tax doesnt cover span of salaries'
+        assert all((0 <= v <= 1) for v in implementation_factor_per_age.values())
+        if horizon_years is None:
+            assert life_exp_years is not None, 'life_exp_years is required unless horizon_years is given'
+            assert life_exp_years > current_age
+        assert -0.1 <= return_rate_after_inflation <= 0.3
+        assert 0 <= existential_risk_discount_rate <= 0.99
+        assert horizon_years is None or horizon_years >= 1
+        assert terminal_value_factor >= 0
+
+        self.current_age = current_age
+        self.current_savings_k = current_savings_k
+        self.life_exp_years = life_exp_years
+        self.horizon_years = horizon_years
+        self.terminal_value_factor = terminal_value_factor
+        self.return_rate_after_inflation = return_rate_after_inflation
+        self.existential_risk_discount_rate = existential_risk_discount_rate
+        self.save_qa_life_cost_k = save_qa_life_cost_k
+        self.net_return_mult = 1 + return_rate_after_inflation - existential_risk_discount_rate
+        self.is_giving_pretax = is_giving_pretax
+        assert 0.01 <= self.net_return_mult <= 2  # Return multiplier can be < 1 after existential risk
+
+        # Save for metadata e.g. prints on ffill
+        self.implementation_factor_per_age = implementation_factor_per_age
+        self.month_salary_k_per_age = month_salary_k_per_age
+        self.month_req_cost_k_per_age = month_req_cost_k_per_age
+        self.share_tax_per_k_salary = share_tax_per_k_salary
+
+    def init_result_placeholders(self):
         # Placeholders for result
         self.sum_given_m = None
         self.lives_saved = None
 
+        # Placeholders for result per return scenario, see robust.run_robust_optimization
+        self.scenario_give_k = None
+        self.scenario_lives_saved = None
+
+        # Placeholder for wealth left at end of horizon, see run_long_horizon_optimization
+        self.terminal_wealth_k = None
+
     @staticmethod
     def calc_disposable_for_giving(df, is_giving_pretax):
         df = df.copy()
-        if is_giving_pretax:
-            df['disposable_for_giving'] = (df['salary_k_year'] - df['req_cost_k_year'] / (1 - df['share_tax'])).round(0)
-        else:
+        if not is_giving_pretax:
             df['salary_k_year_after_tax'] = (df['salary_k_year'] * (1 - df['share_tax'])).round(0)
-            df['disposable_for_giving'] = (df['salary_k_year_after_tax'] - df['req_cost_k_year']).round(0)
+        df['disposable_for_giving'] = kernels.disposable_for_giving(
+            df['salary_k_year'].values, df['req_cost_k_year'].values, df['share_tax'].values, is_giving_pretax
+        )
         return df
 
     @staticmethod
@@ -209,22 +291,12 @@ class Config:
 
 
 def get_A_ub(length: int, r: float = 1.1) -> np.ndarray:
-    A_ub = np.zeros((length, length))
-    for i in range(len(A_ub)):
-        for j in range(len(A_ub)):
-            if i >= j:
-                A_ub[i, j] = r ** (i - j)
-    return A_ub
+    return kernels.compound_matrix(length, r)
 
 
 def get_b_ub(disp: dict, r: float) -> list:
-    b_ub = []
-    i_min = min(disp.keys())
-    for age in disp.keys():
-        res_list = [disp[age_] * r ** (age - age_ + 1) for age_ in range(i_min, age + 1)]
-        res = sum(res_list)
-        b_ub.append(res)
-    return b_ub
+    # Cumulative budget per age, b_ub[i] = sum of disp[j] * r ** (i - j + 1) for j <= i
+    return list(kernels.cumulative_budget(list(disp.values()), r))
 
 
 def get_optimization_variables(conf: Config):
@@ -245,7 +317,10 @@ def get_optimization_variables(conf: Config):
 def run_linear_optimization(conf: Config):
     c_impl, A_ub, b_ub = get_optimization_variables(conf)
     result_obj = linprog(c_impl, A_ub, b_ub)
-    result = result_obj.x
+    set_optimization_result(conf, result_obj.x, c_impl)
+
+
+def set_optimization_result(conf: Config, result: np.ndarray, c_impl: np.ndarray):
     impl_adj_result = result * c_impl * (-1)
     tot_given = round(np.sum(impl_adj_result), 3)
     lives_saved = int(round(tot_given / conf.save_qa_life_cost_k))
@@ -255,6 +330,153 @@ def run_linear_optimization(conf: Config):
     conf.df['give_recommendation_k'] = np.array(impl_adj_result)
 
 
+def get_long_horizon_variables(conf: Config):
+    """
+    Sparse formulation for long horizons. The dense A_ub has powers r ** (i - j) that overflow or lose precision
+    over hundreds of periods, so the budget is instead a wealth variable per period following the recurrence
+    wealth_t = r * (wealth_t-1 + disp_t) - give_t, wealth_t >= 0
+
+    Giving and wealth in period t are scaled by max(r, 1) ** t (computed in log space) to stay in the magnitude of
+    the disposable income, and objective coefficients are normalized in log space to a max of 1.
+
+    Variable layout: [scaled give per period, scaled wealth per period]
+    """
+    disp = conf.df['disposable_for_giving'].values
+    impl_factor = conf.df['implementation_factor'].values
+    n = len(disp)
+    log_r = np.log(conf.net_return_mult)
+    log_scale = np.arange(n) * max(log_r, 0)
+
+    # Scaled wealth_t - min(r, 1) * scaled wealth_t-1 + scaled give_t = r * disp_t / scale_t
+    identity = sparse.identity(n, format='csr')
+    carry = sparse.diags([np.full(n - 1, -1 * min(conf.net_return_mult, 1.0))], [-1], format='csr')
+    A_eq = sparse.hstack([identity, identity + carry], format='csr')
+    b_eq = disp * np.exp(log_r - log_scale)
+
+    # Impact of giving plus value of wealth at end of horizon
+    with np.errstate(divide='ignore'):
+        log_c = np.concatenate([
+            np.log(impl_factor) + log_scale,
+            np.full(n - 1, -np.inf),
+            [np.log(conf.terminal_value_factor) + log_scale[-1]],
+        ])
+    # All zero when nothing has value (no implementation and no terminal value), then any feasible plan is optimal
+    log_c_norm = log_c.max() if np.isfinite(log_c.max()) else 0.0
+    c = -1 * np.exp(log_c - log_c_norm)
+
+    return c, A_eq, b_eq, log_scale, log_c_norm
+
+
+def run_long_horizon_optimization(conf: Config):
+    c, A_eq, b_eq, log_scale, log_c_norm = get_long_horizon_variables(conf)
+    result_obj = linprog(c, A_eq=A_eq, b_eq=b_eq, method='highs')
+    assert result_obj.success, f'Long horizon optimization failed: {result_obj.message}'
+
+    n = len(log_scale)
+    result = result_obj.x[:n] * np.exp(log_scale)
+    set_optimization_result(conf, result, -1 * conf.df['implementation_factor'].values)
+    conf.terminal_wealth_k = result_obj.x[-1] * np.exp(log_scale[-1])
+
+    # Lives saved including terminal value, which is what was optimized
+    objective_k = -1 * result_obj.fun * np.exp(log_c_norm)
+    conf.lives_saved = int(round(objective_k / conf.save_qa_life_cost_k))
+
+
+class GivingSolver:
+    """
+    Reusable solver for consecutive problems with the same horizon length, e.g. sweeps or interactive use where
+    only b_ub, c_impl or r change slightly between solves.
+    Keeps A_ub for the latest r and the optimal basis of the previous solve. A new problem is first tried on that
+    basis by solving the (LU factorized) basis system directly, and is only sent to linprog if the basis is no
+    longer primal and dual feasible.
+    """
+
+    def __init__(self, length: int, tol: float = 1e-9):
+        self.length = length
+        self.tol = tol
+
+        self.r = None
+        self.A_ub = None
+        self.basic_x = None
+        self.basic_slack = None
+        self.basis_lu = None
+
+        # Counters for how often the previous basis could be reused
+        self.n_warm = 0
+        self.n_cold = 0
+
+    def set_r(self, r: float):
+        if r != self.r:
+            self.r = r
+            self.A_ub = get_A_ub(length=self.length, r=r)
+            self.basis_lu = None
+
+    def set_basis(self, x: np.ndarray, slack: np.ndarray, b_ub: np.ndarray):
+        tol = self.tol * max(1, np.abs(b_ub).max())
+        basic_x = x > tol
+        basic_slack = slack > tol
+        if basic_x.sum() + basic_slack.sum() == self.length:
+            self.basic_x, self.basic_slack = basic_x, basic_slack
+        else:
+            # Degenerate vertex, basis can't be read off from the solution
+            self.basic_x, self.basic_slack = None, None
+        self.basis_lu = None
+
+    def solve_on_basis(self, c_impl: np.ndarray, b_ub: np.ndarray):
+        # Columns of [A_ub I] in the basis
+        if self.basis_lu is None:
+            basis = np.hstack([self.A_ub[:, self.basic_x], np.eye(self.length)[:, self.basic_slack]])
+            self.basis_lu = lu_factor(basis)
+
+        basic_values = lu_solve(self.basis_lu, b_ub)
+        if not np.isfinite(basic_values).all():
+            return None  # Singular or ill-conditioned basis, e.g. after r changed
+        tol = self.tol * max(1, np.abs(b_ub).max())
+        if (basic_values < -tol).any():
+            return None  # Not primal feasible
+
+        c_basis = np.concatenate([c_impl[self.basic_x], np.zeros(self.basic_slack.sum())])
+        duals = lu_solve(self.basis_lu, c_basis, trans=1)
+        if not np.isfinite(duals).all():
+            return None
+        reduced_cost_x = c_impl - self.A_ub.T @ duals
+        reduced_cost_slack = -1 * duals
+        tol = self.tol * max(1, np.abs(c_impl).max())
+        if (reduced_cost_x[~self.basic_x] < -tol).any() or (reduced_cost_slack[~self.basic_slack] < -tol).any():
+            return None  # Not dual feasible, i.e. not optimal
+
+        x = np.zeros(self.length)
+        x[self.basic_x] = np.maximum(basic_values[:self.basic_x.sum()], 0)
+        return x
+
+    def solve(self, c_impl: np.ndarray, b_ub, r: float) -> np.ndarray:
+        c_impl = np.asarray(c_impl, dtype=float)
+        b_ub = np.asarray(b_ub, dtype=float)
+        assert len(c_impl) == len(b_ub) == self.length, 'Solver is set up for a different horizon length'
+        self.set_r(r)
+
+        if self.basic_x is not None:
+            x = self.solve_on_basis(c_impl, b_ub)
+            if x is not None:
+                self.n_warm += 1
+                return x
+
+        # HiGHS returns a vertex, which the basis is read from (interior-point, the default in older scipy, doesn't)
+        result_obj = linprog(c_impl, self.A_ub, b_ub, method='highs')
+        assert result_obj.success, f'Optimization failed: {result_obj.message}'
+        self.n_cold += 1
+        self.set_basis(result_obj.x, result_obj.slack, b_ub)
+        return result_obj.x
+
+    def run(self, conf: Config):
+        # Same as run_linear_optimization but reusing solver state across calls
+        disp = conf.df.disposable_for_giving.to_dict()
+        c_impl = -1 * conf.df.implementation_factor.values
+        b_ub = get_b_ub(disp=disp, r=conf.net_return_mult)
+        result = self.solve(c_impl, b_ub, r=conf.net_return_mult)
+        set_optimization_result(conf, result, c_impl)
+
+
 def create_dummy_conf(
         current_age=10,
         life_exp_years=15,
@@ -267,6 +489,8 @@ def create_dummy_conf(
         existential_risk_discount_rate=0.00,
         implementation_factor_per_age=None,
         is_giving_pretax=False,
+        horizon_years=None,
+        terminal_value_factor=0.0,
 ):
 
     # Avoid mutable default args
@@ -291,6 +515,8 @@ def create_dummy_conf(
         implementation_factor_per_age=implementation_factor_per_age,
         is_giving_pretax=is_giving_pretax,
         save_qa_life_cost_k=save_qa_life_cost_k,
+        horizon_years=horizon_years,
+        terminal_value_factor=terminal_value_factor,
     )
 
 
@@ -316,3 +542,35 @@ def check_valid_keys(current_age, month_salary_k_per_age, month_req_cost_k_per_a
         min_key = min(min_key, min(implementation_factor_per_age.keys()))
     is_keys_ok = current_age >= min_key
     return is_keys_ok
+
+
+def constant_dict(current_age, life_exp_years, value) -> dict:
+    result_dict = {}
+    result_dict[current_age] = value
+    result_dict[life_exp_years] = value
+    return result_dict
+
+
+def basic_mode_per_age(
+        current_age: int,
+        life_exp_years: int,
+        current_salary_k: float,
+        salary_increase_rate: float,
+        age_of_retirement: int,
+        salary_after_retirement_k: float,
+        cost_of_living_k: float,
+) -> dict:
+    # Per age dicts for Config from the basic mode sliders of the app
+    month_salary_k_per_age = constant_dict(current_age, life_exp_years, value=current_salary_k)
+    for age in range(min(month_salary_k_per_age.keys()) + 1, max(month_salary_k_per_age.keys()) + 1):
+        if age < age_of_retirement:
+            # Recursively apply interest on previous salary
+            month_salary_k_per_age[age] = round(month_salary_k_per_age[age-1] * (1 + salary_increase_rate), 2)
+        else:
+            month_salary_k_per_age[age] = salary_after_retirement_k
+
+    return dict(
+        month_salary_k_per_age=month_salary_k_per_age,
+        month_req_cost_k_per_age=constant_dict(current_age, life_exp_years, value=cost_of_living_k),
+        implementation_factor_per_age=constant_dict(current_age, life_exp_years, 1),
+    )
@@ -0,0 +1,117 @@
+"""
+Numeric kernels for the compounding and budget recurrences.
+Each kernel has a NumPy implementation and a plain loop implementation that is compiled with Numba when it is
+installed. The compiled version is used automatically, otherwise the NumPy fallback.
+"""
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+HAS_NUMBA = numba is not None
+
+
+def compound_matrix_numpy(length: int, r: float) -> np.ndarray:
+    # Powers by repeated multiplication rather than pow, to be reproducible across implementations
+    powers = np.cumprod(np.concatenate([[1.0], np.full(max(length - 1, 0), r)]))
+    i, j = np.indices((length, length))
+    return np.where(i >= j, powers[np.maximum(i - j, 0)], 0.0)
+
+
+def compound_matrix_loop(length: int, r: float) -> np.ndarray:
+    powers = np.ones(length)
+    for k in range(1, length):
+        powers[k] = powers[k - 1] * r
+    A = np.zeros((length, length))
+    for i in range(length):
+        for j in range(i + 1):
+            A[i, j] = powers[i - j]
+    return A
+
+
+def wealth_paths_numpy(disp: np.ndarray, mult: np.ndarray, give: np.ndarray) -> np.ndarray:
+    # Vectorized across paths, recurrence across years
+    wealth = np.empty(mult.shape)
+    previous = np.zeros(mult.shape[0])
+    for t in range(mult.shape[1]):
+        previous = mult[:, t] * (previous + disp[t]) - give[:, t]
+        wealth[:, t] = previous
+    return wealth
+
+
+def wealth_paths_loop(disp: np.ndarray, mult: np.ndarray, give: np.ndarray) -> np.ndarray:
+    n_paths, n_years = mult.shape
+    wealth = np.empty(mult.shape)
+    for k in range(n_paths):
+        previous = 0.0
+        for t in range(n_years):
+            previous = mult[k, t] * (previous + disp[t]) - give[k, t]
+            wealth[k, t] = previous
+    return wealth
+
+
+def disposable_for_giving_numpy(salary_k_year, req_cost_k_year, share_tax, is_giving_pretax: bool) -> np.ndarray:
+    if is_giving_pretax:
+        return np.round(salary_k_year - req_cost_k_year / (1 - share_tax))
+    return np.round(np.round(salary_k_year * (1 - share_tax)) - req_cost_k_year)
+
+
+def disposable_for_giving_loop(salary_k_year, req_cost_k_year, share_tax, is_giving_pretax: bool) -> np.ndarray:
+    disposable = np.empty(len(salary_k_year))
+    for i in range(len(salary_k_year)):
+        if is_giving_pretax:
+            disposable[i] = np.rint(salary_k_year[i] - req_cost_k_year[i] / (1 - share_tax[i]))
+        else:
+            disposable[i] = np.rint(np.rint(salary_k_year[i] * (1 - share_tax[i])) - req_cost_k_year[i])
+    return disposable
+
+
+# Cached on disk, so that only the first process compiles
+if HAS_NUMBA:
+    compound_matrix_numba = numba.njit(cache=True)(compound_matrix_loop)
+    wealth_paths_numba = numba.njit(cache=True)(wealth_paths_loop)
+    disposable_for_giving_numba = numba.njit(cache=True)(disposable_for_giving_loop)
+else:
+    compound_matrix_numba = None
+    wealth_paths_numba = None
+    disposable_for_giving_numba = None
+
+
+def compound_matrix(length: int, r: float) -> np.ndarray:
+    # Lower triangular r ** (i - j), i.e. A_ub
+    if HAS_NUMBA:
+        return compound_matrix_numba(length, float(r))
+    return compound_matrix_numpy(length, r)
+
+
+def wealth_paths(disp, mult, give=None) -> np.ndarray:
+    """
+    Wealth per (path, year) from wealth_t = mult_t * (wealth_t-1 + disp_t) - give_t, where mult can vary per path.
+    Without giving this is the cumulative budget b_ub of each path.
+    """
+    disp = np.ascontiguousarray(disp, dtype=float)
+    mult = np.ascontiguousarray(np.atleast_2d(mult), dtype=float)
+    if give is None:
+        give = np.zeros(mult.shape)
+    give = np.ascontiguousarray(np.broadcast_to(give, mult.shape), dtype=float)
+    assert mult.shape[1] == len(disp), 'Need one return multiplier per year and path'
+    if HAS_NUMBA:
+        return wealth_paths_numba(disp, mult, give)
+    return wealth_paths_numpy(disp, mult, give)
+
+
+def cumulative_budget(disp, r: float) -> np.ndarray:
+    # Same as get_b_ub for a constant return multiplier r
+    disp = np.asarray(disp, dtype=float)
+    return wealth_paths(disp, np.full((1, len(disp)), r))[0]
+
+
+def disposable_for_giving(salary_k_year, req_cost_k_year, share_tax, is_giving_pretax: bool) -> np.ndarray:
+    salary_k_year = np.ascontiguousarray(salary_k_year, dtype=float)
+    req_cost_k_year = np.ascontiguousarray(req_cost_k_year, dtype=float)
+    share_tax = np.ascontiguousarray(share_tax, dtype=float)
+    if HAS_NUMBA:
+        return disposable_for_giving_numba(salary_k_year, req_cost_k_year, share_tax, bool(is_giving_pretax))
+    return disposable_for_giving_numpy(salary_k_year, req_cost_k_year, share_tax, is_giving_pretax)
@@ -0,0 +1,160 @@
+"""
+Opt-in memory instrumentation for long running workers, enabled with MemoryProfiler(enabled=True) or by setting
+the environment variable EA_MEMORY_PROFILE=1.
+Each stage (e.g. Config construction, solve and plotting) records tracemalloc net and peak allocations and the
+process RSS, and report() summarizes them per stage, optionally also per thread.
+
+tracemalloc and RSS are process wide, so stages of one profiler are serialized with a lock to not mix up each
+other's peaks, e.g. a prefetch thread solving while the app plots. Allocations from threads running outside of a
+stage (e.g. Streamlit internals or another session) are still attributed to whichever stage is open.
+"""
+import gc
+import os
+import sys
+import threading
+import tracemalloc
+from contextlib import contextmanager
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from ea_giving_optimizer.charts import chart_spec, render_figure
+from ea_giving_optimizer.helpers import Config, run_linear_optimization
+
+
+def current_rss_bytes() -> int:
+    # Current RSS from /proc on Linux, otherwise peak RSS (ru_maxrss is bytes on macOS, kilobytes elsewhere)
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        if resource is None:
+            return 0
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return max_rss if sys.platform == 'darwin' else max_rss * 1024
+
+
+class MemoryProfiler:
+
+    def __init__(self, enabled: bool = None, keep_snapshots: bool = False, max_records: int = 10000):
+        if enabled is None:
+            enabled = os.environ.get('EA_MEMORY_PROFILE') == '1'
+        self.enabled = enabled
+        self.keep_snapshots = keep_snapshots
+        self.max_records = max_records
+        self.records = []
+        self.snapshots = {}
+        self.is_tracing_started_here = False
+        self.lock = threading.RLock()  # Reentrant for nested stages in one thread
+
+    def start(self):
+        if self.enabled and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.is_tracing_started_here = True
+
+    def stop(self):
+        if self.is_tracing_started_here:
+            tracemalloc.stop()
+            self.is_tracing_started_here = False
+
+    @contextmanager
+    def stage(self, name: str):
+        if not self.enabled:
+            yield
+            return
+
+        with self.lock:
+            self.start()
+            current_before, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            rss_before = current_rss_bytes()
+            try:
+                yield
+            finally:
+                current_after, peak = tracemalloc.get_traced_memory()
+                rss_after = current_rss_bytes()
+                self.records.append({
+                    'stage': name,
+                    'thread': threading.current_thread().name,
+                    'allocated_bytes': current_after - current_before,
+                    'peak_bytes': peak - current_before,
+                    'rss_bytes': rss_after,
+                    'rss_delta_bytes': rss_after - rss_before,
+                })
+                # Bounded, since the profiler itself shouldn't grow a long running worker
+                if len(self.records) > self.max_records:
+                    del self.records[:len(self.records) - self.max_records]
+                if self.keep_snapshots:
+                    self.snapshots[name] = tracemalloc.take_snapshot()
+
+    def report(self, by_thread: bool = False) -> pd.DataFrame:
+        # by_thread e.g. to separate foreground solves from prefetching in the app
+        columns = ['runs', 'allocated_mean_kb', 'allocated_max_kb', 'peak_max_kb', 'rss_last_mb', 'rss_delta_mb']
+        if not self.records:
+            return pd.DataFrame(columns=columns)
+        df = pd.DataFrame(self.records)
+        report = df.groupby(['thread', 'stage'] if by_thread else 'stage', sort=False).agg(
+            runs=('stage', 'size'),
+            allocated_mean_kb=('allocated_bytes', 'mean'),
+            allocated_max_kb=('allocated_bytes', 'max'),
+            peak_max_kb=('peak_bytes', 'max'),
+            rss_last_mb=('rss_bytes', 'last'),
+            rss_delta_mb=('rss_delta_bytes', 'sum'),
+        )
+        report[['allocated_mean_kb', 'allocated_max_kb', 'peak_max_kb']] /= 1024
+        report[['rss_last_mb', 'rss_delta_mb']] /= 1024 ** 2
+        return report.round(1)
+
+    def top_allocations(self, stage: str, limit: int = 10) -> list:
+        # Largest allocation sites alive at the end of a stage, requires keep_snapshots
+        snapshot = self.snapshots[stage]
+        return snapshot.statistics('lineno')[:limit]
+
+    def reset(self):
+        self.records = []
+        self.snapshots = {}
+
+
+def profile_run(params: dict, profiler: MemoryProfiler, plot: bool = True) -> Config:
+    # One app run split in the stages suspected of growing memory
+    with profiler.stage('config'):
+        conf = Config(**params)
+    with profiler.stage('solve'):
+        run_linear_optimization(conf)
+    if plot:
+        # Same rendering as the app, including the shared figure cache
+        with profiler.stage('plot'):
+            for kind in ['cum', 'yearly']:
+                render_figure(chart_spec(conf, kind))
+    return conf
+
+
+def measure_growth(func, n_runs: int, n_warmup: int = 10) -> int:
+    """
+    Net traced bytes still allocated after n_runs calls of func, after warm up calls to fill caches and
+    garbage collection. Growing with n_runs indicates a leak.
+    """
+    is_tracing_started_here = not tracemalloc.is_tracing()
+    if is_tracing_started_here:
+        tracemalloc.start()
+    try:
+        for _ in range(n_warmup):
+            func()
+        gc.collect()
+        current_before, _ = tracemalloc.get_traced_memory()
+        for _ in range(n_runs):
+            func()
+        gc.collect()
+        current_after, _ = tracemalloc.get_traced_memory()
+    finally:
+        if is_tracing_started_here:
+            tracemalloc.stop()
+    return current_after - current_before
+
+
+# Process wide profiler, e.g. for the app where the script reruns on every interaction
+default_profiler = MemoryProfiler()
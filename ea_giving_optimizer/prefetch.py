@@ -0,0 +1,204 @@
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Slider step and bounds in the units of the solve params (app sliders are in percent or USD), in order of
+# preference until any have changed. The basic mode salary sliders are only in the params in basic mode
+SLIDER_STEPS = {
+    'return_rate_after_inflation': 0.001,
+    'existential_risk_discount_rate': 0.0001,
+    'current_age': 1,
+    'life_exp_years': 1,
+    'age_of_retirement': 1,
+    'salary_increase_rate': 0.005,
+    'save_qa_life_cost_k': 0.001,
+}
+SLIDER_BOUNDS = {
+    'return_rate_after_inflation': (0.0, 0.2),
+    'existential_risk_discount_rate': (0.0, 0.2),
+    'current_age': (15, 150),
+    'life_exp_years': (15, 150),
+    'age_of_retirement': (15, 150),
+    'salary_increase_rate': (0.0, 0.5),
+    'save_qa_life_cost_k': (1.0, 6.0),
+}
+
+
+def params_key(params: dict) -> tuple:
+    # Hashable key, rounding floats so e.g. 3.1 / 100 and 0.031 hit the same entry
+    def freeze(value):
+        if isinstance(value, dict):
+            return tuple(sorted((freeze(k), freeze(v)) for k, v in value.items()))
+        if isinstance(value, float):
+            return round(value, 10)
+        return value
+    return tuple(sorted((k, freeze(v)) for k, v in params.items()))
+
+
+class Prefetcher:
+    """
+    Result cache per session with speculative solving of neighbouring slider values.
+    After each submit, a background thread solves the problems one slider step up and down for the parameters
+    that have changed most often between submits, so that nudging a slider one notch is usually a cache hit.
+    Prefetching after each submit is bounded by cpu_budget_s of thread CPU time, and in total over the session by
+    session_cpu_budget_s. Only the latest round of prefetching is kept in the queue.
+    """
+
+    def __init__(
+            self,
+            solve_func,
+            cpu_budget_s: float = 1.0,
+            session_cpu_budget_s: float = 30.0,
+            max_params: int = 2,
+            max_cache: int = 64,
+    ):
+        self.solve_func = solve_func
+        self.cpu_budget_s = cpu_budget_s
+        self.session_cpu_budget_s = session_cpu_budget_s
+        self.max_params = max_params
+        self.max_cache = max_cache
+
+        self.cache = OrderedDict()
+        self.prefetched_keys = set()
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='prefetch')
+        self.round = 0
+
+        self.previous_params = None
+        self.change_counts = Counter()
+
+        # Stats
+        self.hits = 0
+        self.misses = 0
+        self.prefetch_hits = 0
+        self.n_prefetched = 0
+        self.cpu_used_s = 0.0
+
+    def solve(self, params: dict):
+        key = params_key(params)
+        with self.lock:
+            future = self.pending.get(key)
+            # Still queued: solve here rather than wait behind other prefetching, otherwise wait for it to finish
+            if future is not None and future.cancel():
+                self.pending.pop(key, None)
+                future = None
+        if future is not None:
+            future.result()
+
+        with self.lock:
+            if key in self.cache:
+                self.hits += 1
+                if key in self.prefetched_keys:
+                    self.prefetch_hits += 1
+                    self.prefetched_keys.discard(key)
+                self.cache.move_to_end(key)
+                result = self.cache[key]
+            else:
+                self.misses += 1
+                result = None
+
+        if result is None:
+            result = self.solve_func(**params)
+            self.store(key, result)
+
+        self.track_changes(params)
+        self.schedule_prefetch(params)
+        return result
+
+    def store(self, key, result, is_prefetch=False):
+        with self.lock:
+            self.cache[key] = result
+            self.cache.move_to_end(key)
+            if is_prefetch:
+                self.prefetched_keys.add(key)
+                self.n_prefetched += 1
+            while len(self.cache) > self.max_cache:
+                old_key, _ = self.cache.popitem(last=False)
+                self.prefetched_keys.discard(old_key)
+
+    def track_changes(self, params: dict):
+        if self.previous_params is not None:
+            for name in SLIDER_STEPS:
+                if params.get(name) != self.previous_params.get(name):
+                    self.change_counts[name] += 1
+        self.previous_params = dict(params)
+
+    def neighbours(self, params: dict) -> list:
+        # Most changed parameters first, in SLIDER_STEPS order until anything has changed
+        names = sorted(
+            (name for name in SLIDER_STEPS if name in params),
+            key=lambda name: -self.change_counts[name],
+        )[:self.max_params]
+
+        neighbours = []
+        for name in names:
+            low, high = SLIDER_BOUNDS[name]
+            for direction in [1, -1]:
+                value = round(params[name] + direction * SLIDER_STEPS[name], 10)
+                if low <= value <= high:
+                    neighbours.append({**params, name: value})
+        return neighbours
+
+    def is_session_over_budget(self) -> bool:
+        # Call with the lock held
+        return self.cpu_used_s >= self.session_cpu_budget_s
+
+    def schedule_prefetch(self, params: dict):
+        with self.lock:
+            self.round += 1
+            prefetch_round = self.round
+            cpu_start = self.cpu_used_s
+            if self.is_session_over_budget():
+                return
+
+        for neighbour in self.neighbours(params):
+            key = params_key(neighbour)
+            with self.lock:
+                if key in self.cache or key in self.pending:
+                    continue
+                self.pending[key] = self.executor.submit(self.prefetch, neighbour, key, prefetch_round, cpu_start)
+
+    def prefetch(self, params: dict, key, prefetch_round: int, cpu_start: float):
+        try:
+            with self.lock:
+                is_stale = prefetch_round != self.round
+                is_over_budget = self.cpu_used_s - cpu_start >= self.cpu_budget_s or self.is_session_over_budget()
+            if is_stale or is_over_budget:
+                return
+
+            start = time.thread_time()
+            try:
+                result = self.solve_func(**params)
+            except Exception:
+                # E.g. invalid neighbouring values, will fail again with a message on a real submit
+                result = None
+            with self.lock:
+                self.cpu_used_s += time.thread_time() - start
+            if result is not None:
+                self.store(key, result, is_prefetch=True)
+        finally:
+            with self.lock:
+                self.pending.pop(key, None)
+
+    def wait(self):
+        # Block until queued prefetching is done, mainly for tests and benchmarks
+        with self.lock:
+            futures = list(self.pending.values())
+        for future in futures:
+            future.result()
+
+    def stats(self) -> dict:
+        with self.lock:
+            requests = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / requests if requests else 0.0,
+                'prefetched': self.n_prefetched,
+                'prefetch_hits': self.prefetch_hits,
+                'prefetch_hit_rate': self.prefetch_hits / self.n_prefetched if self.n_prefetched else 0.0,
+                'cpu_used_s': self.cpu_used_s,
+            }
@@ -0,0 +1,208 @@
+import numpy as np
+from scipy import sparse
+from scipy.optimize import linprog
+
+from ea_giving_optimizer.helpers import Config
+
+
+OBJECTIVES = ('expected', 'worst_case', 'cvar')
+
+
+def simulate_return_scenarios(
+        n_years: int,
+        mean: float,
+        std: float,
+        branching: tuple,
+        seed: int = None,
+) -> np.ndarray:
+    """
+    Scenario tree of yearly returns after inflation, one row per scenario and prod(branching) scenarios.
+    The horizon is split in len(branching) stages of about equal length. At the start of stage s each node branches
+    into branching[s] children, and all scenarios under a node share its returns during the stage, so decisions
+    are shared within a node. A single stage, e.g. branching=(1000,), is a fan of independent paths where only the
+    first year decision is shared and the rest of each path is planned with perfect foresight.
+    """
+    rng = np.random.default_rng(seed)
+    n_scenarios = int(np.prod(branching))
+    stage_per_year = np.arange(n_years) * len(branching) // n_years
+    returns = np.empty((n_scenarios, n_years))
+    n_nodes = 1
+    for stage, n_children in enumerate(branching):
+        n_nodes *= n_children
+        is_stage_year = stage_per_year == stage
+        node_returns = rng.normal(loc=mean, scale=std, size=(n_nodes, is_stage_year.sum()))
+        returns[:, is_stage_year] = np.repeat(node_returns, n_scenarios // n_nodes, axis=0)
+    return returns
+
+
+def get_history_ids(return_scenarios: np.ndarray) -> np.ndarray:
+    """
+    Id of the return history per (scenario, t) after the returns of years 0..t-1 are realized, so column 0 is the
+    shared root and column n_years the full path. Scenarios with the same history share the id.
+    """
+    n_scenarios, n_years = return_scenarios.shape
+    history_ids = np.zeros((n_scenarios, n_years + 1), dtype=int)
+    ids = np.zeros(n_scenarios, dtype=int)
+    offset = 1
+    for t in range(1, n_years + 1):
+        history = np.column_stack([ids, return_scenarios[:, t - 1]])
+        _, ids = np.unique(history, axis=0, return_inverse=True)
+        ids = ids.ravel()
+        history_ids[:, t] = ids + offset
+        offset += ids.max() + 1
+    return history_ids
+
+
+def get_scenario_node_ids(return_scenarios: np.ndarray, is_single_schedule: bool = False) -> np.ndarray:
+    """
+    Decision node per (scenario, year) for a non-anticipative plan: giving in year t can only depend on
+    returns already realized in years 0..t-1, so scenarios sharing that history share the decision.
+    With is_single_schedule, all scenarios share one decision per year, i.e. a fixed giving schedule.
+    """
+    n_scenarios, n_years = return_scenarios.shape
+    if is_single_schedule:
+        return np.tile(np.arange(n_years), (n_scenarios, 1))
+    return get_history_ids(return_scenarios)[:, :-1]
+
+
+def get_robust_optimization_variables(
+        conf: Config,
+        return_scenarios: np.ndarray,
+        objective: str = 'expected',
+        cvar_alpha: float = 0.1,
+        scenario_probs: np.ndarray = None,
+        is_single_schedule: bool = False,
+):
+    """
+    Sparse LP over all scenarios at once. Instead of the dense cumulative A_ub/b_ub per scenario, the budget is
+    carried by a wealth variable following the same recurrence as get_b_ub:
+    wealth_t = mult_t * (wealth_t-1 + disp_t) - give_t, wealth_t >= 0
+
+    Wealth in year t only depends on the return history through year t, so there is one wealth variable per
+    history node of the tree rather than per (scenario, year). For worst case and CVaR, impact is accumulated the
+    same way per history node, so each scenario's impact is a single variable at its leaf.
+
+    Variable layout: [give per decision node, wealth per history node, objective auxiliaries], where the
+    auxiliaries are [impact per history node, level] for worst case and also [shortfall per scenario] for CVaR.
+    """
+    assert objective in OBJECTIVES, f'objective must be one of {OBJECTIVES}'
+    assert 0 < cvar_alpha <= 1
+
+    disp = conf.df['disposable_for_giving'].values
+    impl_factor = conf.df['implementation_factor'].values
+    n_scenarios, n_years = return_scenarios.shape
+    assert n_years == len(disp), 'Return scenarios must have one column per year in conf.df'
+
+    if scenario_probs is None:
+        scenario_probs = np.full(n_scenarios, 1 / n_scenarios)
+    assert len(scenario_probs) == n_scenarios and np.isclose(np.sum(scenario_probs), 1)
+
+    mult = 1 + return_scenarios - conf.existential_risk_discount_rate
+    assert (mult > 0).all(), 'Return scenarios give non-positive return multiplier after existential risk'
+
+    history_ids = get_history_ids(return_scenarios)
+    node_ids = history_ids[:, :-1] if not is_single_schedule else np.tile(np.arange(n_years), (n_scenarios, 1))
+    n_nodes = node_ids.max() + 1
+
+    # History node after the returns of year t, numbered from 0, one row per node from any scenario through it
+    post_ids = history_ids[:, 1:] - 1
+    n_post = post_ids.max() + 1
+    _, first = np.unique(post_ids.ravel(), return_index=True)
+    scenario, year = np.divmod(first, n_years)
+    give_cols = node_ids[scenario, year]
+    has_parent = year > 0
+    parent_ids = post_ids[scenario[has_parent], year[has_parent] - 1]
+    rows = np.arange(n_post)
+
+    # Wealth recurrence as equality constraints
+    wealth_col = n_nodes
+    eq_rows = [rows, rows, rows[has_parent]]
+    eq_cols = [wealth_col + rows, give_cols, wealth_col + parent_ids]
+    eq_vals = [np.ones(n_post), np.ones(n_post), -mult[scenario[has_parent], year[has_parent]]]
+    b_eq = mult[scenario, year] * disp[year]
+
+    n_aux = {'expected': 0, 'worst_case': n_post + 1, 'cvar': n_post + 1 + n_scenarios}[objective]
+    n_vars = n_nodes + n_post + n_aux
+    c = np.zeros(n_vars)
+    bounds = [(0, None)] * (n_nodes + n_post)
+    A_ub, b_ub = None, None
+
+    if objective == 'expected':
+        weights = scenario_probs[:, None] * impl_factor[None, :]
+        c[:n_nodes] = -1 * np.bincount(node_ids.ravel(), weights=weights.ravel(), minlength=n_nodes)
+
+    else:
+        # Cumulative impact per history node: impact_t - impact_t-1 - impl_t * give_t = 0
+        impact_col = n_nodes + n_post
+        eq_rows += [n_post + rows, n_post + rows, n_post + rows[has_parent]]
+        eq_cols += [impact_col + rows, give_cols, impact_col + parent_ids]
+        eq_vals += [np.ones(n_post), -impl_factor[year], -np.ones(has_parent.sum())]
+        b_eq = np.concatenate([b_eq, np.zeros(n_post)])
+        bounds += [(0, None)] * n_post
+
+        # Level variable z (worst case) or eta (VaR in CVaR), bounded by the impact at each scenario's leaf
+        level_col = impact_col + n_post
+        scenarios = np.arange(n_scenarios)
+        ub_rows = [scenarios, scenarios]
+        ub_cols = [impact_col + post_ids[:, -1], np.full(n_scenarios, level_col)]
+        ub_vals = [-np.ones(n_scenarios), np.ones(n_scenarios)]
+        c[level_col] = -1
+        bounds += [(None, None)]
+        if objective == 'cvar':
+            # eta - impact_k - shortfall_k <= 0, maximize eta - E[shortfall] / alpha
+            ub_rows.append(scenarios)
+            ub_cols.append(level_col + 1 + scenarios)
+            ub_vals.append(-np.ones(n_scenarios))
+            c[level_col + 1:] = scenario_probs / cvar_alpha
+            bounds += [(0, None)] * n_scenarios
+        A_ub = sparse.csr_matrix(
+            (np.concatenate(ub_vals), (np.concatenate(ub_rows), np.concatenate(ub_cols))),
+            shape=(n_scenarios, n_vars),
+        )
+        b_ub = np.zeros(n_scenarios)
+
+    A_eq = sparse.csr_matrix(
+        (np.concatenate(eq_vals), (np.concatenate(eq_rows), np.concatenate(eq_cols))),
+        shape=(len(b_eq), n_vars),
+    )
+    return c, A_ub, b_ub, A_eq, b_eq, bounds, node_ids
+
+
+def run_robust_optimization(
+        conf: Config,
+        return_scenarios: np.ndarray,
+        objective: str = 'expected',
+        cvar_alpha: float = 0.1,
+        scenario_probs: np.ndarray = None,
+        is_single_schedule: bool = False,
+):
+    """
+    One non-anticipative giving plan across all return scenarios, maximizing expected, worst case or
+    CVaR (mean of the worst cvar_alpha share of scenarios) lives saved.
+    By default the plan is a policy over the scenario tree (see simulate_return_scenarios), and the giving
+    recommendation in conf.df is the expected giving per year, where the first year is the same for all scenarios
+    and is what can be acted on now. With is_single_schedule, the plan is one fixed schedule followed in every
+    scenario, and conf.df holds that schedule.
+    """
+    return_scenarios = np.atleast_2d(np.asarray(return_scenarios, dtype=float))
+    if scenario_probs is None:
+        scenario_probs = np.full(len(return_scenarios), 1 / len(return_scenarios))
+    c, A_ub, b_ub, A_eq, b_eq, bounds, node_ids = get_robust_optimization_variables(
+        conf, return_scenarios, objective=objective, cvar_alpha=cvar_alpha, scenario_probs=scenario_probs,
+        is_single_schedule=is_single_schedule,
+    )
+    result_obj = linprog(c, A_ub=A_ub, b_ub=b_ub, A_eq=A_eq, b_eq=b_eq, bounds=bounds, method='highs')
+    assert result_obj.success, f'Robust optimization failed: {result_obj.message}'
+
+    impl_factor = conf.df['implementation_factor'].values
+    scenario_give_k = result_obj.x[node_ids] * impl_factor
+    scenario_given_k = scenario_give_k.sum(axis=1)
+    objective_given_k = -1 * result_obj.fun
+
+    conf.scenario_give_k = scenario_give_k
+    conf.scenario_lives_saved = scenario_given_k / conf.save_qa_life_cost_k
+    conf.lives_saved = int(round(objective_given_k / conf.save_qa_life_cost_k))
+    conf.sum_given_m = round(float(scenario_probs @ scenario_given_k), 3) / 1000
+    expected_give_k = scenario_probs @ scenario_give_k
+    conf.df['give_recommendation_m'] = expected_give_k / 1000
+    conf.df['give_recommendation_k'] = expected_give_k
@@ -0,0 +1,232 @@
+"""
+Declarative scenario files (TOML or JSON) with the same keys as Config, e.g.
+
+    current_age = 30
+    life_exp_years = 80
+    save_qa_life_cost_k = 3.5
+    is_giving_pretax = false
+    return_rate_after_inflation = 0.03
+    existential_risk_discount_rate = 0.02
+
+    [month_salary_k_per_age]
+    30 = 4.0
+    66 = 1.5
+
+    [share_tax_per_k_salary]  # Non integer salaries need quoted keys in TOML, e.g. "0.5" = 0.18
+    0 = 0.18
+    10 = 0.38
+
+Scenarios are validated and compiled into the interpolated per-age arrays of Config.df, cached as .npz keyed by a
+hash of the file content, so reloading a saved scenario skips parsing and interpolation.
+"""
+import hashlib
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from ea_giving_optimizer.helpers import Config, check_valid_keys
+
+try:
+    import tomllib
+except ImportError:
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
+
+
+# Bump when the compiled layout or Config interpolation changes, to invalidate old caches
+COMPILED_FORMAT_VERSION = 1
+
+# Key: (type, is_required)
+SCENARIO_SCHEMA = {
+    'current_age': (int, True),
+    'life_exp_years': (int, False),  # Required unless horizon_years is given
+    'save_qa_life_cost_k': (float, True),
+    'is_giving_pretax': (bool, True),
+    'month_salary_k_per_age': (dict, True),
+    'month_req_cost_k_per_age': (dict, True),
+    'share_tax_per_k_salary': (dict, True),
+    'return_rate_after_inflation': (float, True),
+    'existential_risk_discount_rate': (float, True),
+    'implementation_factor_per_age': (dict, True),
+    'current_savings_k': (float, False),
+    'horizon_years': (int, False),
+    'terminal_value_factor': (float, False),
+}
+
+SCENARIO_DEFAULTS = {
+    'current_savings_k': 0.0,
+    'life_exp_years': None,
+    'horizon_years': None,
+    'terminal_value_factor': 0.0,
+}
+
+# Dict values per age have int keys, the share tax has salary (float) keys
+DICT_KEY_TYPES = {
+    'month_salary_k_per_age': int,
+    'month_req_cost_k_per_age': int,
+    'implementation_factor_per_age': int,
+    'share_tax_per_k_salary': float,
+}
+
+
+def parse_scenario(content: bytes, is_toml: bool) -> dict:
+    if is_toml:
+        if tomllib is None:
+            raise ImportError('Reading TOML scenarios requires Python 3.11+ or the tomli package')
+        return tomllib.loads(content.decode('utf-8'))
+    return json.loads(content)
+
+
+def is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def validate_scenario(raw: dict) -> dict:
+    """
+    Check a parsed scenario against the schema and the consistency checks in Config.__init__ and check_valid_keys.
+    Returns keyword arguments for Config, raises ValueError listing all problems found.
+    """
+    errors = []
+
+    unknown = set(raw) - set(SCENARIO_SCHEMA)
+    if unknown:
+        errors.append(f'Unknown keys: {sorted(unknown)}')
+
+    params = dict(SCENARIO_DEFAULTS)
+    for key, (value_type, is_required) in SCENARIO_SCHEMA.items():
+        if key not in raw:
+            if is_required:
+                errors.append(f'Missing required key: {key}')
+            continue
+        value = raw[key]
+        if value is None and not is_required:
+            continue
+
+        if value_type is bool and not isinstance(value, bool):
+            errors.append(f'{key} should be true or false, got {value!r}')
+        elif value_type is int and not (isinstance(value, int) and not isinstance(value, bool)):
+            errors.append(f'{key} should be an integer, got {value!r}')
+        elif value_type is float and not is_number(value):
+            errors.append(f'{key} should be a number, got {value!r}')
+        elif value_type is dict:
+            if not isinstance(value, dict) or len(value) == 0:
+                errors.append(f'{key} should be a non empty table of {{key: value}}')
+                continue
+            converted = {}
+            for k, v in value.items():
+                try:
+                    converted_key = DICT_KEY_TYPES[key](k)
+                except (TypeError, ValueError):
+                    errors.append(f'{key} has invalid key {k!r}')
+                    continue
+                if not is_number(v):
+                    errors.append(f'{key}[{k}] should be a number, got {v!r}')
+                    continue
+                converted[converted_key] = v
+            value = dict(sorted(converted.items()))
+        params[key] = value
+
+    if errors:
+        raise ValueError('Invalid scenario: ' + '; '.join(errors))
+
+    # Same checks as Config.__init__ and check_valid_keys, but collected as messages
+    share_tax = params['share_tax_per_k_salary']
+    salaries = params['month_salary_k_per_age'].values()
+    if not all(0 <= v <= 1 for v in share_tax.values()):
+        errors.append('share_tax_per_k_salary values should be between 0 and 1')
+    if max(share_tax) < max(salaries):
+        errors.append('Maximum share tax doesnt cover span of salaries')
+    if min(share_tax) > min(salaries):
+        errors.append('Minimum share tax doesnt cover span of salaries')
+    if not all(0 <= v <= 1 for v in params['implementation_factor_per_age'].values()):
+        errors.append('implementation_factor_per_age values should be between 0 and 1')
+    if params['horizon_years'] is None:
+        if params['life_exp_years'] is None:
+            errors.append('life_exp_years is required unless horizon_years is given')
+        elif not params['life_exp_years'] > params['current_age']:
+            errors.append('life_exp_years should be larger than current_age')
+    if not -0.1 <= params['return_rate_after_inflation'] <= 0.3:
+        errors.append('return_rate_after_inflation should be between -0.1 and 0.3')
+    if not 0 <= params['existential_risk_discount_rate'] <= 0.99:
+        errors.append('existential_risk_discount_rate should be between 0 and 0.99')
+    net_return_mult = 1 + params['return_rate_after_inflation'] - params['existential_risk_discount_rate']
+    if not 0.01 <= net_return_mult <= 2:
+        errors.append('Return multiplier after existential risk should be between 0.01 and 2')
+    if params['horizon_years'] is not None and params['horizon_years'] < 1:
+        errors.append('horizon_years should be at least 1')
+    if params['terminal_value_factor'] < 0:
+        errors.append('terminal_value_factor should not be negative')
+    if not check_valid_keys(
+            params['current_age'],
+            params['month_salary_k_per_age'],
+            params['month_req_cost_k_per_age'],
+            params['implementation_factor_per_age'],
+    ):
+        errors.append('current_age should not be less than the lowest age of the per age tables')
+
+    if errors:
+        raise ValueError('Invalid scenario: ' + '; '.join(errors))
+    return params
+
+
+def content_hash(content: bytes) -> str:
+    return hashlib.sha256(f'v{COMPILED_FORMAT_VERSION}:'.encode() + content).hexdigest()
+
+
+def save_compiled(conf: Config, params: dict, path):
+    # JSON can't have int keys, so per age dicts are stored as lists of [key, value]
+    meta = {
+        'params': {k: list(v.items()) if isinstance(v, dict) else v for k, v in params.items()},
+        'df_columns': list(conf.df.columns),
+        'tax_columns': list(conf.tax_per_salary_df.columns),
+    }
+    arrays = {f'df__{c}': conf.df[c].values for c in conf.df.columns}
+    arrays.update({f'tax__{c}': conf.tax_per_salary_df[c].values for c in conf.tax_per_salary_df.columns})
+    np.savez(path, meta=np.array(json.dumps(meta)), df_index=conf.df.index.values, **arrays)
+
+
+def load_compiled(path) -> Config:
+    with np.load(path, allow_pickle=False) as data:
+        meta = json.loads(str(data['meta']))
+        df = pd.DataFrame(
+            {c: data[f'df__{c}'] for c in meta['df_columns']},
+            index=pd.Index(data['df_index'], name='age'),
+        )
+        tax_per_salary_df = pd.DataFrame({c: data[f'tax__{c}'] for c in meta['tax_columns']})
+
+    params = {k: dict((DICT_KEY_TYPES[k](i), j) for i, j in v) if k in DICT_KEY_TYPES else v
+              for k, v in meta['params'].items()}
+    return Config.from_df(df, tax_per_salary_df, **params)
+
+
+def load_scenario(path, cache_dir=None) -> Config:
+    """
+    Config from a TOML or JSON scenario file. With a cache_dir, the compiled scenario is stored there as
+    <content hash>.npz and later loads of the same content skip parsing, validation and interpolation.
+    """
+    with open(path, 'rb') as f:
+        content = f.read()
+
+    cache_path = None
+    if cache_dir is not None:
+        cache_path = os.path.join(cache_dir, f'{content_hash(content)}.npz')
+        if os.path.exists(cache_path):
+            return load_compiled(cache_path)
+
+    params = validate_scenario(parse_scenario(content, is_toml=str(path).endswith('.toml')))
+    conf = Config(**params)
+
+    if cache_path is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f'{cache_path}.{os.getpid()}.tmp.npz'
+        save_compiled(conf, params, tmp_path)
+        os.replace(tmp_path, cache_path)  # Atomic, for batch jobs loading in parallel
+    return conf
+
+
+def load_scenarios(paths, cache_dir=None) -> list:
+    return [load_scenario(path, cache_dir=cache_dir) for path in paths]
@@ -0,0 +1,80 @@
+from ea_giving_optimizer import charts
+from ea_giving_optimizer.helpers import create_dummy_conf, run_linear_optimization, run_long_horizon_optimization
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+
+def solved_conf(**kwargs):
+    conf = create_dummy_conf(**kwargs)
+    run_linear_optimization(conf)
+    return conf
+
+
+def test_spec_matches_plotly_summary():
+    conf = solved_conf(existential_risk_discount_rate=0.02)
+    for kind, fig in [('cum', conf.plotly_summary_cum()), ('yearly', conf.plotly_summary())]:
+        spec = charts.chart_spec(conf, kind)
+        assert np.array_equal(spec['x'], fig.data[0].x)
+        assert np.allclose(spec['y'], fig.data[0].y)
+
+        rendered = charts.render_figure(spec)
+        assert np.array_equal(rendered.data[0].y, spec['y'])
+        assert rendered.layout.title.text == fig.layout.title.text
+        assert rendered.layout.yaxis.title.text == fig.layout.yaxis.title.text
+
+
+def test_downsample_keeps_peaks_and_ends():
+    x = np.arange(10000)
+    y = np.zeros(10000)
+    y[4321] = 5
+    y[-1] = 1
+    x_small, y_small = charts.downsample(x, y, max_points=100)
+
+    assert len(x_small) <= 100
+    assert x_small[0] == 0 and x_small[-1] == 9999
+    assert 4321 in x_small and y_small.max() == 5
+    assert (np.diff(x_small) > 0).all()
+
+    # Short series unchanged
+    x_short, y_short = charts.downsample(x[:50], y[:50], max_points=100)
+    assert np.array_equal(x_short, x[:50]) and np.array_equal(y_short, y[:50])
+
+
+def test_long_horizon_downsampled():
+    # 720 yearly periods, e.g. a foundation
+    conf = create_dummy_conf(horizon_years=720, existential_risk_discount_rate=0.002)
+    run_long_horizon_optimization(conf)
+    spec = charts.chart_spec(conf, 'yearly', max_points=200)
+    assert len(spec['x']) <= 200
+    assert spec['x'][0] == conf.df.index[0] and spec['x'][-1] == conf.df.index[-1]
+    assert spec['y'].max() == np.round(conf.df['give_recommendation_k'].values, 3).max()
+
+
+def test_figure_cache():
+    charts.figure_cache.clear()
+    conf = solved_conf(existential_risk_discount_rate=0.02)
+    fig = charts.render_figure(charts.chart_spec(conf, 'cum'), height=300, width=700)
+
+    # Same result and size => same figure, different result or size => new figure
+    assert charts.render_figure(charts.chart_spec(conf, 'cum'), height=300, width=700) is fig
+    assert charts.render_figure(charts.chart_spec(conf, 'cum'), height=350, width=700) is not fig
+    other = solved_conf(return_rate_after_inflation=0.01)
+    assert charts.render_figure(charts.chart_spec(other, 'cum'), height=300, width=700) is not fig
+
+    for i in range(charts.MAX_CACHED_FIGURES + 5):
+        charts.render_figure(charts.chart_spec(conf, 'cum'), height=100 + i, width=700)
+    assert len(charts.figure_cache) == charts.MAX_CACHED_FIGURES
+
+
+def test_figure_cache_threads():
+    # App sessions render concurrently into the shared cache
+    charts.figure_cache.clear()
+    spec = charts.chart_spec(solved_conf(existential_risk_discount_rate=0.02), 'yearly')
+
+    def render(i):
+        return charts.render_figure(spec, height=100 + i % (2 * charts.MAX_CACHED_FIGURES), width=700)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        figures = list(executor.map(render, range(400)))
+    assert len(charts.figure_cache) == charts.MAX_CACHED_FIGURES
+    assert charts.render_figure(spec, height=100 + 399 % (2 * charts.MAX_CACHED_FIGURES), width=700) is figures[-1]
@@ -1,10 +1,16 @@
 from ea_giving_optimizer.helpers import (
     get_b_ub,
     run_linear_optimization,
-    create_dummy_conf
+    create_dummy_conf,
+    GivingSolver,
+    basic_mode_per_age,
+    get_long_horizon_variables,
+    run_long_horizon_optimization
 )
 import pytest
 import numpy as np
+import pandas as pd
+from scipy.optimize import linprog
 
 
 def test_get_b_ub():
@@ -241,3 +247,151 @@ def test_pretax_giving():
     )
     run_linear_optimization(conf_post_tax)
     assert conf_post_tax.sum_given_m / (1 - share_tax) == pytest.approx(conf.sum_given_m, 0.005)
+
+
+def test_giving_solver_matches_linear_optimization():
+    solver = GivingSolver(length=6)
+    for return_rate, x_risk in [(0.01, 0), (0.01, 0.02), (0.011, 0.02), (0.03, 0.01), (0.03, 0.011)]:
+        conf = create_dummy_conf(return_rate_after_inflation=return_rate, existential_risk_discount_rate=x_risk)
+        run_linear_optimization(conf)
+
+        conf_solver = create_dummy_conf(return_rate_after_inflation=return_rate, existential_risk_discount_rate=x_risk)
+        solver.run(conf_solver)
+
+        assert conf_solver.sum_given_m == pytest.approx(conf.sum_given_m, 1e-6)
+        assert np.allclose(conf_solver.df['give_recommendation_k'], conf.df['give_recommendation_k'])
+
+    # Neighbouring problems should reuse the previous basis
+    assert solver.n_warm >= 2
+
+
+def test_giving_solver_warm_start_sweep():
+    length = 20
+    rng = np.random.default_rng(0)
+    disp = dict(enumerate(rng.uniform(10, 50, size=length)))
+    c_impl = -1 * np.linspace(1, 0.7, length)
+    solver = GivingSolver(length=length)
+
+    for r in np.linspace(0.97, 1.03, 50):
+        b_ub = get_b_ub(disp, r)
+        x = solver.solve(c_impl, b_ub, r)
+        assert solver.basic_x is not None  # Cold solves should give a vertex to read the basis from
+        expected = linprog(c_impl, solver.A_ub, b_ub, method='highs')
+        assert c_impl @ x == pytest.approx(expected.fun, 1e-7)
+        assert (solver.A_ub @ x <= np.array(b_ub) * (1 + 1e-9)).all()
+
+    assert solver.n_warm > solver.n_cold
+
+
+@pytest.mark.filterwarnings('ignore::scipy.linalg.LinAlgWarning')
+def test_giving_solver_singular_basis_falls_back():
+    # With r = 1 the last column of A_ub equals the last slack column, so this basis is singular
+    length = 4
+    solver = GivingSolver(length=length)
+    solver.set_r(1.0)
+    solver.basic_x = np.array([False, False, False, True])
+    solver.basic_slack = np.array([False, True, True, True])
+
+    # Nothing to give and no value of giving, so the basis solve gives 0 / 0 rather than an infeasible -inf
+    c_impl = np.zeros(length)
+    b_ub = np.zeros(length)
+    x = solver.solve(c_impl, b_ub, 1.0)
+
+    assert np.isfinite(x).all()
+    assert solver.n_warm == 0 and solver.n_cold == 1
+
+
+def test_long_horizon_matches_linear_optimization():
+    for return_rate, x_risk in [(0.03, 0), (0.01, 0.02)]:
+        conf = create_dummy_conf(
+            return_rate_after_inflation=return_rate,
+            existential_risk_discount_rate=x_risk,
+            implementation_factor_per_age={10: 1, 15: 0.8},
+        )
+        run_linear_optimization(conf)
+
+        conf_long = create_dummy_conf(
+            return_rate_after_inflation=return_rate,
+            existential_risk_discount_rate=x_risk,
+            implementation_factor_per_age={10: 1, 15: 0.8},
+        )
+        run_long_horizon_optimization(conf_long)
+
+        assert conf_long.sum_given_m == pytest.approx(conf.sum_given_m, 1e-6)
+        assert np.allclose(conf_long.df['give_recommendation_k'], conf.df['give_recommendation_k'], atol=1e-6)
+
+
+def test_long_horizon_500_periods():
+    horizon_years = 500
+    for return_rate, x_risk in [(0.07, 0), (0.3, 0), (0, 0.1)]:
+        conf = create_dummy_conf(
+            horizon_years=horizon_years,
+            return_rate_after_inflation=return_rate,
+            existential_risk_discount_rate=x_risk,
+        )
+        assert len(conf.df) == horizon_years
+        run_long_horizon_optimization(conf)
+
+        r = conf.net_return_mult
+        disp = conf.df['disposable_for_giving'].values
+        give = conf.df['give_recommendation_k'].values
+        assert np.isfinite(give).all()
+        if r > 1:
+            # Everything given in the last period, compounded in log space for the expected value
+            expected = np.sum(disp * np.exp((horizon_years - np.arange(horizon_years)) * np.log(r)))
+            assert give[-1] == pytest.approx(expected, 1e-9)
+            assert give[:-1] == pytest.approx(0, abs=1e-6 * expected)
+        else:
+            # Everything given right away
+            assert give == pytest.approx(disp * r, 1e-9)
+
+
+def test_long_horizon_terminal_value():
+    # Terminal value higher than implementation factor of giving => keep everything
+    conf = create_dummy_conf(
+        horizon_years=50,
+        return_rate_after_inflation=0.02,
+        implementation_factor_per_age={10: 1, 15: 0.5},
+        terminal_value_factor=0.6,
+    )
+    run_long_horizon_optimization(conf)
+    assert conf.sum_given_m == pytest.approx(0, abs=1e-9)
+    assert conf.terminal_wealth_k > 0
+    assert conf.lives_saved == int(round(0.6 * conf.terminal_wealth_k / conf.save_qa_life_cost_k))
+
+
+def test_long_horizon_no_value():
+    # Nothing has value, the objective is all zero and should still solve like the dense formulation
+    conf = create_dummy_conf(horizon_years=50, implementation_factor_per_age={10: 0, 15: 0})
+    c, _, _, _, log_c_norm = get_long_horizon_variables(conf)
+    assert (c == 0).all() and log_c_norm == 0
+
+    run_long_horizon_optimization(conf)
+    conf_dense = create_dummy_conf(horizon_years=50, implementation_factor_per_age={10: 0, 15: 0})
+    run_linear_optimization(conf_dense)
+    assert conf.sum_given_m == conf_dense.sum_given_m == 0
+    assert conf.lives_saved == conf_dense.lives_saved == 0
+
+
+def test_long_horizon_without_life_expectancy():
+    conf = create_dummy_conf(life_exp_years=None, horizon_years=50)
+    conf_with_life_exp = create_dummy_conf(life_exp_years=15, horizon_years=50)
+    pd.testing.assert_frame_equal(conf.df, conf_with_life_exp.df)
+
+    with pytest.raises(AssertionError, match='life_exp_years is required'):
+        create_dummy_conf(life_exp_years=None)
+
+
+def test_basic_mode_per_age():
+    per_age = basic_mode_per_age(
+        current_age=30,
+        life_exp_years=35,
+        current_salary_k=4,
+        salary_increase_rate=0.1,
+        age_of_retirement=33,
+        salary_after_retirement_k=1.5,
+        cost_of_living_k=1,
+    )
+    assert per_age['month_salary_k_per_age'] == {30: 4, 31: 4.4, 32: 4.84, 33: 1.5, 34: 1.5, 35: 1.5}
+    assert per_age['month_req_cost_k_per_age'] == {30: 1, 35: 1}
+    assert per_age['implementation_factor_per_age'] == {30: 1, 35: 1}
@@ -0,0 +1,56 @@
+from ea_giving_optimizer import kernels
+from ea_giving_optimizer.helpers import get_A_ub, get_b_ub
+import pytest
+import numpy as np
+
+
+# Loop implementations are also run uncompiled so they are checked without Numba installed
+IMPLEMENTATIONS = {
+    'compound_matrix': [kernels.compound_matrix_loop, kernels.compound_matrix_numba],
+    'wealth_paths': [kernels.wealth_paths_loop, kernels.wealth_paths_numba],
+    'disposable_for_giving': [kernels.disposable_for_giving_loop, kernels.disposable_for_giving_numba],
+}
+
+
+def implementations(name):
+    return [impl for impl in IMPLEMENTATIONS[name] if impl is not None]
+
+
+@pytest.mark.parametrize('r', [0.95, 1.0, 1.07])
+def test_compound_matrix(r):
+    expected = kernels.compound_matrix_numpy(30, r)
+    for impl in implementations('compound_matrix'):
+        np.testing.assert_array_equal(impl(30, r), expected)
+
+    # Same as the original double loop definition of A_ub
+    assert get_A_ub(3, r=2).tolist() == [[1, 0, 0], [2, 1, 0], [4, 2, 1]]
+
+
+def test_wealth_paths():
+    rng = np.random.default_rng(0)
+    disp = rng.uniform(-5, 50, size=40)
+    mult = 1 + rng.normal(0.03, 0.15, size=(200, 40))
+    give = rng.uniform(0, 10, size=(200, 40))
+
+    expected = kernels.wealth_paths_numpy(disp, mult, give)
+    for impl in implementations('wealth_paths'):
+        np.testing.assert_array_equal(impl(disp, mult, give), expected)
+
+
+def test_cumulative_budget_matches_b_ub():
+    disp = {4: 1.11, 5: 2, 6: 1}
+    r = 1.07
+    expected = [sum(disp[age_] * r ** (age - age_ + 1) for age_ in range(4, age + 1)) for age in disp]
+    assert get_b_ub(disp, r) == pytest.approx(expected, rel=1e-12)
+
+
+@pytest.mark.parametrize('is_giving_pretax', [True, False])
+def test_disposable_for_giving(is_giving_pretax):
+    rng = np.random.default_rng(1)
+    salary = rng.uniform(20, 200, size=100)
+    cost = rng.uniform(10, 50, size=100)
+    tax = rng.uniform(0, 0.6, size=100)
+
+    expected = kernels.disposable_for_giving_numpy(salary, cost, tax, is_giving_pretax)
+    for impl in implementations('disposable_for_giving'):
+        np.testing.assert_array_equal(impl(salary, cost, tax, is_giving_pretax), expected)
@@ -0,0 +1,136 @@
+from ea_giving_optimizer import charts
+from ea_giving_optimizer.helpers import GivingSolver, create_dummy_conf, get_b_ub
+from ea_giving_optimizer.memory_profile import MemoryProfiler, measure_growth, profile_run
+import itertools
+import os
+import threading
+import tracemalloc
+import pytest
+
+
+PARAMS = dict(
+    current_age=30,
+    life_exp_years=85,
+    current_savings_k=0,
+    save_qa_life_cost_k=3.5,
+    is_giving_pretax=False,
+    month_salary_k_per_age={30: 4, 40: 5, 64: 5.5, 66: 1.5},
+    month_req_cost_k_per_age={30: 1.8, 65: 2, 66: 1.1},
+    share_tax_per_k_salary={0: 0.18, 10: 0.38},
+    return_rate_after_inflation=0.03,
+    existential_risk_discount_rate=0.02,
+    implementation_factor_per_age={30: 1, 55: 0.9, 85: 0.5},
+)
+
+# Budgets for one run of 56 years, well above what is needed today but far below e.g. copies of the df per run
+SOLVE_PEAK_BUDGET_KB = 2 * 1024
+CONFIG_PEAK_BUDGET_KB = 10 * 1024
+PLOT_PEAK_BUDGET_KB = 1024
+
+# Net growth per run allowed in short leak checks. Keeping one Config or one 56 x 56 A_ub per run is ~25 KB per
+# run, while one-off allocations after the warm up (e.g. caches) are below 1 KB per run over 50 runs
+LEAK_BUDGET_PER_RUN_BYTES = 2 * 1024
+
+# Long leak checks of the full app path, run with EA_SLOW_TESTS=1
+slow = pytest.mark.skipif(os.environ.get('EA_SLOW_TESTS') != '1', reason='Slow, set EA_SLOW_TESTS=1 to run')
+
+# More distinct results than fit in charts.figure_cache, so that plotting keeps evicting figures
+RETURN_RATES = [0.03 + i / 1000 for i in range(40)]
+
+
+def test_disabled_profiler_records_nothing():
+    profiler = MemoryProfiler(enabled=False)
+    profile_run(PARAMS, profiler, plot=False)
+    assert profiler.records == []
+    assert profiler.report().empty
+
+
+def test_stage_report_and_allocation_budget():
+    profiler = MemoryProfiler(enabled=True, keep_snapshots=True)
+    try:
+        for return_rate in RETURN_RATES[:2]:
+            profile_run({**PARAMS, 'return_rate_after_inflation': return_rate}, profiler)
+    finally:
+        profiler.stop()
+    assert not tracemalloc.is_tracing()
+
+    report = profiler.report()
+    assert list(report.index) == ['config', 'solve', 'plot']
+    assert (report['runs'] == 2).all()
+    assert report.loc['solve', 'peak_max_kb'] < SOLVE_PEAK_BUDGET_KB
+    assert report.loc['config', 'peak_max_kb'] < CONFIG_PEAK_BUDGET_KB
+
+    # Second render of a new result, the first one includes lazy imports in plotly
+    plot_peaks_kb = [r['peak_bytes'] / 1024 for r in profiler.records if r['stage'] == 'plot']
+    assert plot_peaks_kb[-1] < PLOT_PEAK_BUDGET_KB
+    assert len(profiler.top_allocations('solve', limit=3)) == 3
+
+
+def test_stage_report_by_thread():
+    profiler = MemoryProfiler(enabled=True)
+    try:
+        thread = threading.Thread(target=profile_run, args=(PARAMS, profiler, False), name='prefetch_0')
+        thread.start()
+        profile_run(PARAMS, profiler, plot=False)
+        thread.join()
+    finally:
+        profiler.stop()
+
+    report = profiler.report(by_thread=True)
+    assert set(report.index) == {
+        (name, stage) for name in ['prefetch_0', threading.current_thread().name] for stage in ['config', 'solve']
+    }
+    assert (report['runs'] == 1).all()
+
+
+def test_no_leak_consecutive_solves():
+    # 10k consecutive solves of a long lived worker with r changing every solve, so that A_ub and the basis LU
+    # are rebuilt each time. Leaking one 56 x 56 A_ub per solve would be ~250 MB
+    conf = create_dummy_conf(**PARAMS)
+    solver = GivingSolver(length=len(conf.df))
+    c_impl = -1 * conf.df['implementation_factor'].values
+    disp = conf.df['disposable_for_giving'].to_dict()
+    problems = [(get_b_ub(disp, r), r) for r in [conf.net_return_mult - 0.001, conf.net_return_mult]]
+    problem_cycle = itertools.cycle(problems)
+
+    def solve():
+        b_ub, r = next(problem_cycle)
+        solver.solve(c_impl, b_ub, r)
+
+    growth = measure_growth(solve, n_runs=10000)
+    assert growth < 1024 ** 2  # ~100 bytes per solve
+
+
+def test_no_leak_consecutive_runs():
+    # App path with a new return rate (i.e. new A_ub and figures) every run, warming up until the figure cache is full
+    profiler = MemoryProfiler(enabled=False)
+    return_rate_cycle = itertools.cycle(RETURN_RATES)
+
+    def run():
+        profile_run({**PARAMS, 'return_rate_after_inflation': next(return_rate_cycle)}, profiler, plot=True)
+
+    n_runs = 50
+    growth = measure_growth(run, n_runs=n_runs, n_warmup=charts.MAX_CACHED_FIGURES)
+    assert growth / n_runs < LEAK_BUDGET_PER_RUN_BYTES
+
+
+def test_leak_check_detects_kept_config():
+    # The budget above should catch keeping a reference to one Config per run
+    profiler = MemoryProfiler(enabled=False)
+    kept = []
+    n_runs = 20
+    growth = measure_growth(lambda: kept.append(profile_run(PARAMS, profiler, plot=False)), n_runs=n_runs)
+    assert growth / n_runs > LEAK_BUDGET_PER_RUN_BYTES
+
+
+@slow
+def test_no_leak_consecutive_app_runs():
+    # 10k runs of the app path including plots, with a new return rate (i.e. new A_ub) every run
+    profiler = MemoryProfiler(enabled=False)
+    return_rate_cycle = itertools.cycle(RETURN_RATES)
+
+    def run():
+        profile_run({**PARAMS, 'return_rate_after_inflation': next(return_rate_cycle)}, profiler, plot=True)
+
+    growth = measure_growth(run, n_runs=10000, n_warmup=charts.MAX_CACHED_FIGURES)
+    assert growth < 1024 ** 2  # ~100 bytes per run
@@ -0,0 +1,126 @@
+from ea_giving_optimizer.helpers import Config, run_linear_optimization, create_dummy_conf
+from ea_giving_optimizer.prefetch import Prefetcher, params_key
+import threading
+import time
+
+
+def solve_dummy(**params):
+    conf = create_dummy_conf(**params)
+    run_linear_optimization(conf)
+    return conf
+
+
+def test_params_key():
+    assert params_key({'a': 3.1 / 100, 'b': {10: 1}}) == params_key({'b': {10: 1}, 'a': 0.031})
+    assert params_key({'a': 0.031}) != params_key({'a': 0.032})
+
+
+def test_prefetch_neighbour_is_hit():
+    prefetcher = Prefetcher(solve_dummy, cpu_budget_s=10)
+    params = dict(return_rate_after_inflation=0.03, existential_risk_discount_rate=0.02)
+
+    conf = prefetcher.solve(params)
+    assert isinstance(conf, Config)
+    prefetcher.wait()
+
+    # One slider notch up on the return rate
+    conf_next = prefetcher.solve({**params, 'return_rate_after_inflation': 0.031})
+    expected = solve_dummy(**{**params, 'return_rate_after_inflation': 0.031})
+    assert conf_next.sum_given_m == expected.sum_given_m
+
+    stats = prefetcher.stats()
+    assert stats['misses'] == 1
+    assert stats['hits'] == 1
+    assert stats['prefetch_hits'] == 1
+
+
+def test_prefetch_most_changed_params_first():
+    prefetcher = Prefetcher(solve_dummy, cpu_budget_s=10, max_params=1)
+    params = dict(return_rate_after_inflation=0.03, existential_risk_discount_rate=0.02)
+    prefetcher.solve(params)
+    prefetcher.solve({**params, 'existential_risk_discount_rate': 0.0201})
+    prefetcher.wait()
+
+    neighbours = prefetcher.neighbours({**params, 'existential_risk_discount_rate': 0.0201})
+    assert {tuple(sorted(n.items())) for n in neighbours} == {
+        tuple(sorted({**params, 'existential_risk_discount_rate': 0.0202}.items())),
+        tuple(sorted({**params, 'existential_risk_discount_rate': 0.02}.items())),
+    }
+
+
+def test_prefetch_cpu_budget():
+    def slow_solve(**params):
+        start = time.thread_time()
+        while time.thread_time() - start < 0.05:
+            pass
+        return params
+
+    prefetcher = Prefetcher(slow_solve, cpu_budget_s=0.01)
+    prefetcher.solve(dict(return_rate_after_inflation=0.03, existential_risk_discount_rate=0.02))
+    prefetcher.wait()
+
+    # First prefetch exhausts the budget, remaining neighbours are skipped
+    assert prefetcher.stats()['prefetched'] == 1
+
+
+def test_prefetch_session_cpu_budget():
+    def slow_solve(**params):
+        start = time.thread_time()
+        while time.thread_time() - start < 0.05:
+            pass
+        return params
+
+    prefetcher = Prefetcher(slow_solve, cpu_budget_s=10, session_cpu_budget_s=0.01)
+    params = dict(return_rate_after_inflation=0.03, existential_risk_discount_rate=0.02)
+    prefetcher.solve(params)
+    prefetcher.wait()
+    assert prefetcher.stats()['prefetched'] == 1
+
+    # Budget per submit starts over, but the session budget is already used up
+    prefetcher.solve({**params, 'return_rate_after_inflation': 0.05})
+    prefetcher.wait()
+    assert prefetcher.stats()['prefetched'] == 1
+
+
+def test_queued_prefetch_solved_in_foreground():
+    release = threading.Event()
+
+    def blocking_solve(**params):
+        if threading.current_thread().name.startswith('prefetch'):
+            release.wait(timeout=10)
+        return params
+
+    prefetcher = Prefetcher(blocking_solve, cpu_budget_s=10)
+    params = dict(return_rate_after_inflation=0.03, existential_risk_discount_rate=0.02)
+    prefetcher.solve(params)
+
+    # Return rate up is running in the blocked worker, return rate down is still queued behind it
+    start = time.perf_counter()
+    result = prefetcher.solve({**params, 'return_rate_after_inflation': 0.029})
+    assert time.perf_counter() - start < 5
+    assert result['return_rate_after_inflation'] == 0.029
+    assert prefetcher.stats()['misses'] == 2
+
+    release.set()
+    prefetcher.wait()
+
+
+def test_prefetch_ranks_all_sliders():
+    prefetcher = Prefetcher(lambda **params: params, cpu_budget_s=10, max_params=2)
+    params = dict(
+        return_rate_after_inflation=0.03,
+        existential_risk_discount_rate=0.02,
+        current_age=30,
+        life_exp_years=150,
+        age_of_retirement=65,
+    )
+    for changes in [{'life_exp_years': 149}, {'life_exp_years': 150, 'age_of_retirement': 64}, {'life_exp_years': 149}]:
+        params = {**params, **changes}
+        prefetcher.solve(params)
+    prefetcher.wait()
+
+    # Most changed first (life expectancy, then retirement age), neighbours outside the slider bounds are skipped
+    current = {**params, 'life_exp_years': 150}
+    neighbours = prefetcher.neighbours(current)
+    assert [(n['life_exp_years'], n['age_of_retirement']) for n in neighbours] == [(149, 64), (150, 65), (150, 63)]
+    assert all(n['return_rate_after_inflation'] == 0.03 for n in neighbours)
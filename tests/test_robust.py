@@ -0,0 +1,97 @@
+from ea_giving_optimizer.helpers import (
+    run_linear_optimization,
+    create_dummy_conf
+)
+from ea_giving_optimizer.robust import (
+    get_scenario_node_ids,
+    run_robust_optimization,
+    simulate_return_scenarios
+)
+import pytest
+import numpy as np
+
+
+def test_single_scenario_matches_linear_optimization():
+    conf = create_dummy_conf(return_rate_after_inflation=0.03, existential_risk_discount_rate=0.01)
+    run_linear_optimization(conf)
+
+    conf_robust = create_dummy_conf(return_rate_after_inflation=0.03, existential_risk_discount_rate=0.01)
+    run_robust_optimization(conf_robust, np.full((1, len(conf_robust.df)), 0.03))
+
+    assert conf_robust.sum_given_m == pytest.approx(conf.sum_given_m, 0.001)
+    assert np.allclose(conf_robust.df['give_recommendation_k'], conf.df['give_recommendation_k'], atol=0.01)
+
+
+def test_scenario_node_ids():
+    returns = np.array([
+        [0.01, 0.02, 0.03],
+        [0.01, 0.02, 0.05],
+        [0.01, 0.04, 0.03],
+    ])
+    node_ids = get_scenario_node_ids(returns)
+
+    # Shared first year, then branching only where return history differs
+    assert (node_ids[:, 0] == node_ids[0, 0]).all()
+    assert node_ids[0, 1] == node_ids[1, 1] == node_ids[2, 1]
+    assert node_ids[0, 2] == node_ids[1, 2] != node_ids[2, 2]
+    assert len(np.unique(node_ids)) == 1 + 1 + 2
+
+
+def test_non_anticipative_first_year():
+    conf = create_dummy_conf(existential_risk_discount_rate=0.02)
+    returns = simulate_return_scenarios(len(conf.df), mean=0.03, std=0.1, branching=(5, 5, 2), seed=1)
+    run_robust_optimization(conf, returns)
+    assert np.allclose(conf.scenario_give_k[:, 0], conf.scenario_give_k[0, 0])
+
+
+def test_simulated_tree_shares_later_decisions():
+    conf = create_dummy_conf(existential_risk_discount_rate=0.02)
+    n_years = len(conf.df)
+    returns = simulate_return_scenarios(n_years, mean=0.03, std=0.1, branching=(4, 3), seed=3)
+    assert returns.shape == (12, n_years)
+    node_ids = get_scenario_node_ids(returns)
+
+    # Decisions branch only when a stage starts: 1 node, then 4 first stage branches, then 12 leaves
+    n_nodes_per_year = [len(np.unique(node_ids[:, t])) for t in range(n_years)]
+    n_first_stage_years = int(np.ceil(n_years / 2))
+    assert n_nodes_per_year == [1] + [4] * n_first_stage_years + [12] * (n_years - n_first_stage_years - 1)
+    assert (node_ids[:3, 1:n_first_stage_years + 1] == node_ids[0, 1:n_first_stage_years + 1]).all()
+    assert (node_ids[0, 1:] != node_ids[3, 1:]).all()
+
+    run_robust_optimization(conf, returns)
+    for t in range(1, n_years):
+        for node in np.unique(node_ids[:, t]):
+            is_node = node_ids[:, t] == node
+            assert np.allclose(conf.scenario_give_k[is_node, t], conf.scenario_give_k[is_node, t][0])
+
+
+def test_single_schedule():
+    conf = create_dummy_conf(existential_risk_discount_rate=0.02)
+    returns = simulate_return_scenarios(len(conf.df), mean=0.03, std=0.1, branching=(20,), seed=4)
+    run_robust_optimization(conf, returns, is_single_schedule=True)
+    assert np.allclose(conf.scenario_give_k, conf.scenario_give_k[0])
+    assert np.allclose(conf.df['give_recommendation_k'], conf.scenario_give_k[0])
+
+
+def test_objectives_ordering():
+    conf = create_dummy_conf(existential_risk_discount_rate=0.02)
+    returns = simulate_return_scenarios(len(conf.df), mean=0.03, std=0.1, branching=(6, 5), seed=2)
+
+    lives = {}
+    for objective, alpha in [('expected', 0.1), ('worst_case', 0.1), ('cvar', 0.2), ('cvar', 1)]:
+        conf.save_qa_life_cost_k = 0.001  # Small to keep resolution in rounded lives_saved
+        run_robust_optimization(conf, returns, objective=objective, cvar_alpha=alpha)
+        lives[(objective, alpha)] = conf.lives_saved
+
+    assert lives[('worst_case', 0.1)] <= lives[('cvar', 0.2)] <= lives[('expected', 0.1)]
+    assert lives[('cvar', 1)] == pytest.approx(lives[('expected', 0.1)], rel=1e-6, abs=1)
+
+
+def test_worst_case_is_lowest_scenario():
+    conf = create_dummy_conf(existential_risk_discount_rate=0.02)
+    conf.save_qa_life_cost_k = 0.001
+    returns = simulate_return_scenarios(len(conf.df), mean=0.03, std=0.1, branching=(3, 4), seed=5)
+    run_robust_optimization(conf, returns, objective='worst_case')
+
+    # Impact accumulated per history node should equal the impact of each scenario's own giving
+    assert conf.lives_saved == pytest.approx(conf.scenario_lives_saved.min(), abs=1)
@@ -0,0 +1,157 @@
+from ea_giving_optimizer.helpers import Config, run_linear_optimization
+from ea_giving_optimizer import scenario_files
+from ea_giving_optimizer.scenario_files import load_scenario, load_scenarios, validate_scenario
+import json
+import os
+import pytest
+import pandas as pd
+
+
+SCENARIO = {
+    'current_age': 30,
+    'life_exp_years': 80,
+    'save_qa_life_cost_k': 3.5,
+    'is_giving_pretax': False,
+    'month_salary_k_per_age': {'30': 4, '40': 5, '64': 5.5, '66': 1.5},
+    'month_req_cost_k_per_age': {'30': 1.8, '65': 2, '66': 1.1},
+    'share_tax_per_k_salary': {'0': 0.18, '2': 0.2, '4': 0.225, '6': 0.3, '10': 0.38},
+    'return_rate_after_inflation': 0.03,
+    'existential_risk_discount_rate': 0.02,
+    'implementation_factor_per_age': {'30': 1, '45': 1, '55': 0.9, '80': 0.5},
+    'current_savings_k': 10,
+}
+
+SCENARIO_TOML = """
+current_age = 30
+life_exp_years = 80
+save_qa_life_cost_k = 3.5
+is_giving_pretax = false
+return_rate_after_inflation = 0.03
+existential_risk_discount_rate = 0.02
+current_savings_k = 10
+
+[month_salary_k_per_age]
+30 = 4
+40 = 5
+64 = 5.5
+66 = 1.5
+
+[month_req_cost_k_per_age]
+30 = 1.8
+65 = 2
+66 = 1.1
+
+[share_tax_per_k_salary]
+0 = 0.18
+2 = 0.2
+4 = 0.225
+6 = 0.3
+10 = 0.38
+
+[implementation_factor_per_age]
+30 = 1
+45 = 1
+55 = 0.9
+80 = 0.5
+"""
+
+
+def direct_conf():
+    return Config(**validate_scenario(SCENARIO))
+
+
+def test_load_json_and_toml(tmp_path):
+    json_path = tmp_path / 'scenario.json'
+    json_path.write_text(json.dumps(SCENARIO))
+    toml_path = tmp_path / 'scenario.toml'
+    toml_path.write_text(SCENARIO_TOML)
+
+    expected = direct_conf()
+    for path in [json_path, toml_path]:
+        pd.testing.assert_frame_equal(load_scenario(path).df, expected.df)
+
+
+def test_compiled_cache_skips_parsing(tmp_path, monkeypatch):
+    path = tmp_path / 'scenario.json'
+    path.write_text(json.dumps(SCENARIO))
+    cache_dir = tmp_path / 'cache'
+
+    conf = load_scenario(path, cache_dir=cache_dir)
+    assert len(os.listdir(cache_dir)) == 1
+
+    # Reload must come from the .npz without parsing or interpolating again
+    def fail(*args, **kwargs):
+        raise AssertionError('Should not parse or interpolate on cache hit')
+    monkeypatch.setattr(scenario_files, 'parse_scenario', fail)
+    monkeypatch.setattr(Config, 'interpolate_df_from_dict', fail)
+
+    conf_cached, = load_scenarios([path], cache_dir=cache_dir)
+    pd.testing.assert_frame_equal(conf_cached.df, conf.df)
+    pd.testing.assert_frame_equal(conf_cached.tax_per_salary_df, conf.tax_per_salary_df)
+    assert set(vars(conf_cached)) == set(vars(conf))
+    for name, value in vars(conf).items():
+        if not isinstance(value, pd.DataFrame):
+            assert getattr(conf_cached, name) == value, name
+
+    run_linear_optimization(conf)
+    run_linear_optimization(conf_cached)
+    assert conf_cached.lives_saved == conf.lives_saved
+
+
+def test_from_df_checks_params():
+    conf = direct_conf()
+    params = validate_scenario(SCENARIO)
+    with pytest.raises(TypeError, match='life_exp_year'):
+        Config.from_df(conf.df, conf.tax_per_salary_df, **{**params, 'life_exp_year': 80})
+    with pytest.raises(AssertionError):
+        Config.from_df(conf.df, conf.tax_per_salary_df, **{**params, 'implementation_factor_per_age': {30: 1.5}})
+
+
+def test_changed_content_new_cache_entry(tmp_path):
+    path = tmp_path / 'scenario.json'
+    cache_dir = tmp_path / 'cache'
+    path.write_text(json.dumps(SCENARIO))
+    load_scenario(path, cache_dir=cache_dir)
+    path.write_text(json.dumps({**SCENARIO, 'current_savings_k': 20}))
+    conf = load_scenario(path, cache_dir=cache_dir)
+
+    assert len(os.listdir(cache_dir)) == 2
+    assert conf.df['disposable_for_giving'].iloc[0] == direct_conf().df['disposable_for_giving'].iloc[0] + 10
+
+
+@pytest.mark.parametrize('changes, message', [
+    ({'current_age': 'thirty'}, 'current_age should be an integer'),
+    ({'is_giving_pretax': 1}, 'is_giving_pretax should be true or false'),
+    ({'month_salary_k_per_age': {'thirty': 4}}, 'invalid key'),
+    ({'share_tax_per_k_salary': {'0': 0.18, '5': 0.3}}, 'Maximum share tax doesnt cover span of salaries'),
+    ({'implementation_factor_per_age': {'30': 1.5}}, 'implementation_factor_per_age values'),
+    ({'existential_risk_discount_rate': 1.5}, 'existential_risk_discount_rate should be between'),
+    ({'current_age': 20, 'life_exp_years': 80}, 'current_age should not be less than'),
+    ({'unknown_key': 1}, 'Unknown keys'),
+])
+def test_validation_errors(changes, message):
+    with pytest.raises(ValueError, match=message):
+        validate_scenario({**SCENARIO, **changes})
+
+
+def test_horizon_without_life_expectancy(tmp_path):
+    scenario = {**SCENARIO, 'horizon_years': 100}
+    del scenario['life_exp_years']
+    path = tmp_path / 'foundation.json'
+    path.write_text(json.dumps(scenario))
+
+    conf = load_scenario(path, cache_dir=tmp_path / 'cache')
+    conf_cached = load_scenario(path, cache_dir=tmp_path / 'cache')
+    assert len(conf.df) == len(conf_cached.df) == 100
+    assert conf_cached.life_exp_years is None
+
+    del scenario['horizon_years']
+    with pytest.raises(ValueError, match='life_exp_years is required unless horizon_years is given'):
+        validate_scenario(scenario)
+
+
+def test_missing_required_key():
+    scenario = dict(SCENARIO)
+    del scenario['return_rate_after_inflation']
+    with pytest.raises(ValueError, match='Missing required key: return_rate_after_inflation'):
+        validate_scenario(scenario)